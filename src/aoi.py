@@ -18,51 +18,25 @@ class Aoi:
         convert ogr feature into aoi object
         """
 
-        def getBufferGeometry( geom ):
-
-            """
-            get geometry 
-            """
-            
-            # switch on geometry type            
-            if geom.geom_type == 'Point':
-
-                # convert points to bbox 
-                distance = config.get( 'distance', 1000 )
-                buffer = Aoi.getBoundingBox( geom.bounds, distance )
-
-            else:
-
-                if config.get( 'bbox' ) is not None:
-                
-                    # convert points to bbox 
-                    distance = config.get( 'distance', 1000 )
-                    buffer = Aoi.getBoundingBox( ( geom.centroid.x, geom.centroid.y ), distance )
-
-                else:
-
-                    # transform shapely object to utm
-                    proj = Aoi.getUtmTransformation( ( geom.bounds[ 0 ], geom.bounds[ 1 ] ) )
-                    geom_utm = transform( proj[ 'geo2utm' ].transform, geom ) 
-
-                    # apply buffer (in meters) and convert back to epsg4326
-                    distance = config.get( 'distance', 100 )
-                    geom_utm = geom_utm.buffer( distance )
+        # open geometry from ogr feature
+        json_obj = json.loads( feature.ExportToJson() )
+        return Aoi.fromGeometry( json_obj.get( 'geometry' ), json_obj[ 'properties' ], config )
 
-                    buffer = transform( proj[ 'utm2geo' ].transform, geom_utm )
 
-            return buffer, distance
+    @staticmethod
+    def fromGeometry( geom, properties, config ):
 
+        """
+        convert geometry and feature properties into aoi object
+        """
 
-        # open geometry from ogr feature
-        json_obj = json.loads( feature.ExportToJson() )
         _name = config.get( 'name', str( uuid.uuid1() )[:6] )
 
         # refine name if field property defined
         field = config.get( 'field' )
-        if field in json_obj[ 'properties' ]:
+        if field in properties:
             
-            temp = json_obj[ 'properties' ][ field ]
+            temp = properties[ field ]
             if temp is not None:
 
                 # replace invalid chars / spaces with hyphens 
@@ -76,19 +50,57 @@ class Aoi:
                     _name = temp
 
         # locate geometry
-        geom = json_obj.get( 'geometry' )
         if geom is None:
-            geom = json_obj[ 'properties' ].get( 'geometry' )
+            geom = properties.get( 'geometry' )
 
-        # convert wkt string into shapely object
-        if geom is not None:
-            geom = loads( geom ) if isinstance( geom, str ) else shape( geom )
+        # convert wkt string or geojson mapping into shapely object
+        if isinstance( geom, str ):
+            geom = loads( geom )
+        elif isinstance( geom, dict ):
+            geom = shape( geom )
 
         # get geometry and buffer distance
-        buffer, distance = getBufferGeometry( geom )
+        buffer, distance = Aoi.getBufferGeometry( geom, config )
         return { 'name' : _name, 'type' : geom.geom_type, 'distance' : distance, 'geometry' : buffer }
 
 
+    @staticmethod
+    def getBufferGeometry( geom, config ):
+
+        """
+        get geometry 
+        """
+        
+        # switch on geometry type            
+        if geom.geom_type == 'Point':
+
+            # convert points to bbox 
+            distance = config.get( 'distance', 1000 )
+            buffer = Aoi.getBoundingBox( geom.bounds, distance )
+
+        else:
+
+            if config.get( 'bbox' ) is not None:
+            
+                # convert points to bbox 
+                distance = config.get( 'distance', 1000 )
+                buffer = Aoi.getBoundingBox( ( geom.centroid.x, geom.centroid.y ), distance )
+
+            else:
+
+                # transform shapely object to utm
+                proj = Aoi.getUtmTransformation( ( geom.bounds[ 0 ], geom.bounds[ 1 ] ) )
+                geom_utm = transform( proj[ 'geo2utm' ].transform, geom ) 
+
+                # apply buffer (in meters) and convert back to epsg4326
+                distance = config.get( 'distance', 100 )
+                geom_utm = geom_utm.buffer( distance )
+
+                buffer = transform( proj[ 'utm2geo' ].transform, geom_utm )
+
+        return buffer, distance
+
+
     @staticmethod
     def getBoundingBox( centroid, distance ):
 
@@ -1,8 +1,14 @@
 import os
-import glob
+import numpy as np
+
+from string import Formatter
 from osgeo import gdal
-from scraper import TileScraper
-from tiler import MercatorTiler, SlippyTiler
+from scraper import TileScraper, TileFetcher, TaskBatch
+from writer import removeFile
+from tiler import getTiler
+
+# default limit (MB) on in-memory tiles of single download pass before spilling to disk
+SPILL_TO_DISK = 1024
 
 class Downloader:
 
@@ -19,13 +25,27 @@ class Downloader:
         # copy optional arguments    
         self._options = self._config.get( 'options' )
         self._threads = self._config.get( 'threads', 1 )
+        self._workers = self._config.get( 'workers' )
 
-        # create flavour of tiler object
-        if self._config.get( 'type' ) == 'slippy':
-            self._tiler = SlippyTiler()
-        else:
-            self._tiler = MercatorTiler()
+        # enlarge gdal block cache for mosaicking
+        gdal.SetConfigOption( 'GDAL_CACHEMAX', '25%' )
+
+        # http session and event loop shared across aois and jobs
+        self._fetcher = TileFetcher( self._credentials, self._threads, self._workers )
+
+        # get shared flavour of tiler object
+        self._tiler = getTiler( 'slippy' if self._config.get( 'type' ) == 'slippy' else 'mercator' )
+
+        return
+
+
+    def close( self ):
+
+        """
+        release http session
+        """
 
+        self._fetcher.close()
         return
 
 
@@ -48,84 +68,150 @@ class Downloader:
         download tiles aligned with aoi and assimilate into single georeferenced image
         """
 
-        # create output folder if required
-        out_path = os.path.dirname( out_pathname )
-        if not os.path.exists( out_path ):
-            os.makedirs( out_path )
+        self.processMany( [ ( uri, aoi, args, out_pathname ) ] )
+        return
+
+
+    def processMany( self, jobs ):
+
+        """
+        download tiles of multiple ( uri, aoi, args, out_pathname ) jobs in single pass and assimilate per job
+        return output pathnames of successfully merged jobs
+        """
+
+        # tile names derived from output pathname - drop repeated jobs that would overwrite each other's tiles
+        unique = {}
+        for job in jobs:
+
+            if job[ 3 ] in unique:
+                print ( 'Duplicate output pathname ignored: {}'.format( job[ 3 ] ) )
+            else:
+                unique[ job[ 3 ] ] = job
 
-        # create config dict
-        config = {  'tiler' : self._tiler, 
-                    'options' : self._options, 
-                    'credentials' : self._credentials, 
-                    'geometry' : None if aoi.type == 'Point' else aoi.geometry  } # geometry assumed rectangualar if original point-based
+        jobs = list( unique.values() )
 
-        # get tile x, y limits of bbox
-        x1, y1, x2, y2 = self.getTileMinMax( aoi.geometry.bounds, args.zoom )
+        scrapers = []; batches = []
+        for uri, aoi, args, out_pathname in jobs:
 
-        # get tasklist for threads
-        threads = []
-        tasklist = self.getTaskList( uri, (x1,y1,x2,y2), args.zoom, out_path )
-        
-        for idx, tasks in enumerate( tasklist ):
+            # create output folder if required
+            out_path = os.path.dirname( out_pathname )
+            os.makedirs( out_path, exist_ok=True )
 
-            # create derived tilescraper object 
-            obj = TileScraper( idx, tasks, config )
-            obj.start()
-            threads.append( obj )
+            # geometry assumed rectangular if original point-based - type records source geometry, not buffered bbox
+            is_point = aoi.type == 'Point'
+            geometry = aoi.geometry
 
-        # pause main thread until all child threads complete
-        for obj in threads:
-            obj.join()
+            # create config dict
+            config = {  'tiler' : self._tiler, 
+                        'options' : self._options, 
+                        'geometry' : None if is_point else geometry  }
 
-        # generate list of newly downloaded tiles
-        tiles = []
-        for thread in threads:
-            tiles.extend ( thread._tiles )
+            # get tile x, y limits of bbox
+            x1, y1, x2, y2 = self.getTileMinMax( geometry.bounds, args.zoom )
 
-        # merge tiles into single image
-        gdal.Warp( out_pathname, tiles, options=gdal.WarpOptions( gdal.ParseCommandLine( args.options ) ) )
+            # get tiles intersecting aoi
+            scraper = TileScraper( config )
+            batch = scraper.select( self.getTaskList( uri, (x1,y1,x2,y2), args.zoom, out_pathname ) )
 
-        # remove tile files
-        files = glob.glob( os.path.join( out_path, 'tile*' ) )
-        for f in files:
-            os.remove( f )
+            scrapers.append( scraper )
+            batches.append( batch )
+
+        # in-memory tiles of whole pass bounded - spill beyond limit
+        args = jobs[ 0 ][ 2 ]
+        limit = getattr( args, 'spill_to_disk', None )
+        limit = ( limit if limit is not None else SPILL_TO_DISK ) * 1024 * 1024
+
+        # download tiles of all jobs concurrently over shared session - translation overlaps downloads
+        results = self._fetcher.fetch(  batches, 
+                                        limit,
+                                        [ scraper.getHandler( batch ) for scraper, batch in zip( scrapers, batches ) ] )
+
+        merged = []
+        for ( _, _, args, out_pathname ), tiles in zip( jobs, results ):
+
+            # merge georeferenced tiles
+            if self.merge( [ tile for tile in tiles if tile is not None ], args, out_pathname ):
+                merged.append( out_pathname )
+
+        return merged
+
+
+    def merge( self, tiles, args, out_pathname ):
+
+        """
+        merge ( vrt, source tile ) pairs into single georeferenced image and remove tiles - return true if image created
+        """
+
+        # mosaic tile vrts into in-memory vrt - none if no tiles downloaded or selected
+        vrt_pathname = '/vsimem/{}.vrt'.format( os.path.basename( out_pathname ) )
+        vrt = gdal.BuildVRT( vrt_pathname, [ pathname for pathname, _ in tiles ] ) if len( tiles ) > 0 else None
+
+        vrt_created = vrt is not None
+        if vrt_created:
+
+            # merge into single image in one multi-threaded pass
+            gdal.Warp( out_pathname, vrt, options=gdal.WarpOptions(  format=args.format,
+                                                                    multithread=True, 
+                                                                    warpMemoryLimit=512 * 1024 * 1024,
+                                                                    warpOptions=[ 'NUM_THREADS=ALL_CPUS' ],
+                                                                    creationOptions=gdal.ParseCommandLine( args.options ) ) )
+            vrt = None
+            gdal.Unlink( vrt_pathname )
+
+        else:
+
+            # nothing to mosaic - release any tiles and carry on with next job
+            print ( 'Merge Error: no valid tiles for {}'.format( out_pathname ) )
+
+        # remove tile vrts and source png / jpg tiles
+        for pathname, location in tiles:
+            removeFile( pathname )
+            removeFile( location )
 
         # remove path if empty 
-        files = glob.glob( os.path.join( out_path, '*' ) )
-        if len( files ) == 0:
-            os.rmdir( out_path )
+        try:
+            os.rmdir( os.path.dirname( out_pathname ) )
+        except OSError:
+            pass
 
-        return
+        return vrt_created
 
 
-    def getTaskList( self, uri, bbox, zoom, out_path ):
+    def getTaskList( self, uri, bbox, zoom, out_pathname ):
 
         """
-        get tile image from https url
+        get list of tile download tasks aligned with bbox - tiles named after output image
         """
 
-        # initialise list of tasklists
-        tasklist = [ [] for t in range( self._threads ) ]
+        # enumerate tile coordinates row by row
         x1, y1, x2, y2 = bbox
+        YY, XX = np.meshgrid(   np.arange( min( y1, y2 ), max( y1, y2 ) + 1 ), 
+                                np.arange( x1, x2 + 1 ), 
+                                indexing='ij' )
+
+        xs = XX.ravel().tolist()
+        ys = YY.ravel().tolist()
+
+        # reduce uri template once to printf-style template over tile coordinate fields
+        values = { 'z' : str( zoom ), 'format' : self._config.format }
+        template = ''; fields = []
+        for literal, field, _, _ in Formatter().parse( uri ):
 
-        # loop through tile coordinates
-        index = 0
-        for y in range( min( y1, y2 ), max( y1, y2 ) + 1 ):
-            for x in range( x1, x2 + 1 ):
+            template += literal.replace( '%', '%%' )
+            if field is not None:
 
-                # construct url
-                values = { 'x' : x, 'y' : y, 'z' : zoom, 'format' : self._config.format }
-                _uri = uri.format( **values ) 
+                if field in ( 'x', 'y' ):
+                    template += '%d'; fields.append( field )
+                else:
+                    template += values[ field ].replace( '%', '%%' )
 
-                # download tile to pathname
-                pathname = os.path.join( out_path, 'tile_{}_{}_{}.{}'.format( zoom, x, y, self._config.format ) ) 
+        # download tile to pathname unique to output image - jobs sharing folder downloaded in same pass
+        stem = os.path.splitext( out_pathname )[ 0 ]
+        prefix = '{}_tile_{}_'.format( stem, zoom ).replace( '%', '%%' )
+        path_template = prefix + '%d_%d.' + self._config.format.replace( '%', '%%' )
 
-                # append job to list
-                tasklist[ index ].append( { 'xyz' : ( x, y, zoom ), 'uri' : _uri, 'pathname' : pathname } )
-                index += 1
-                
-                # reset thread / taskset index
-                if index == self._threads:
-                    index = 0
+        # assemble uri and pathname of each tile
+        columns = { 'x' : xs, 'y' : ys }
+        uris = [ template % args for args in zip( *[ columns[ field ] for field in fields ] ) ]
 
-        return tasklist
+        return TaskBatch( xs, ys, zoom, uris, [ path_template % xy for xy in zip( xs, ys ) ] )
@@ -1,6 +1,13 @@
 
 import abc
 
+# arrow-backed string columns where available
+try:
+    import pyarrow
+    STRING_DTYPE = 'string[pyarrow]'
+except ImportError:
+    STRING_DTYPE = 'string'
+
 class Endpoint:
 
     def __init__( self, config, args ):
@@ -27,5 +34,14 @@ class Endpoint:
     def getPathname( self, aoi, record ):
         pass
 
+    def getUris( self, inventory ):
+        return [ self.getUri( record ) for record in inventory.itertuples() ]
+
+    def getPathnames( self, aoi, inventory ):
+        return [ self.getPathname( aoi, record ) for record in inventory.itertuples() ]
+
     def filterInventory( self, inventory ):
         return inventory
+
+    def close( self ):
+        pass
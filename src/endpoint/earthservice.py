@@ -2,7 +2,15 @@ import os
 import pandas as pd
 import geopandas as gpd
 
-from endpoint.base import Endpoint
+from endpoint.base import Endpoint, STRING_DTYPE
+
+# single record inventory - geometry assigned per aoi
+_TEMPLATE = gpd.GeoDataFrame(   {   'platform' : pd.Categorical( [ 'misc' ] ),
+                                    'product' : pd.array( [ 'default' ], dtype=STRING_DTYPE ),
+                                    'acq_datetime' : pd.Series( [ pd.NaT ], dtype='datetime64[ns]' ),
+                                    'cloud_cover' : pd.Series( [ 0.0 ], dtype='float32' ) }, 
+                                geometry=[ None ], 
+                                crs='EPSG:3857' )
 
 class Earthservice ( Endpoint ):
 
@@ -16,6 +24,13 @@ class Earthservice ( Endpoint ):
         super().__init__( config, args )
         self._prefix = 'tmsaccess/tms/1.0.0'
 
+        # template uri constant across records
+        self._uri = "{root}/{prefix}/{layer}/{tilematrixset}/{{z}}/{{x}}/{{y}}.png?connectId={id}".format (   root=config.uri,
+                                                                                                            prefix=self._prefix,
+                                                                                                            layer=config.layer,
+                                                                                                            tilematrixset=config.tilematrixset,
+                                                                                                            id=config.id  )
+
         return
 
 
@@ -25,15 +40,11 @@ class Earthservice ( Endpoint ):
         get catalog entries collocated with area of interest
         """
 
-        # create and append feature record
-        records = []
-        records.append ( {  'platform' : 'misc',
-                            'product' : 'default',
-                            'acq_datetime' : pd.NaT,
-                            'cloud_cover' : 0.0,
-                            'geometry' : aoi } )
+        # clone single record template - avoids geodataframe construction per aoi
+        inventory = _TEMPLATE.copy()
+        inventory[ 'geometry' ] = [ aoi ]
 
-        return  gpd.GeoDataFrame( records, crs='EPSG:3857' )
+        return inventory
         
         
     def getUri( self, _ ):
@@ -42,12 +53,27 @@ class Earthservice ( Endpoint ):
         get template uri for inventory record
         """
 
-        # generate template uri including record feature id
-        return  "{root}/{prefix}/{layer}/{tilematrixset}/{{z}}/{{x}}/{{y}}.png?connectId={id}".format ( root=self._config.uri,
-                                                                                                prefix=self._prefix,
-                                                                                                layer=self._config.layer,
-                                                                                                tilematrixset=self._config.tilematrixset,
-                                                                                                id=self._config.id  )
+        # template uri constant across records
+        return self._uri
+
+
+    def getUris( self, inventory ):
+
+        """
+        get template uris for all inventory records
+        """
+
+        return [ self._uri ] * len( inventory )
+
+
+    def getPathnames( self, aoi, inventory ):
+
+        """
+        get pathnames for all inventory records
+        """
+
+        return [ self.getPathname( aoi, None ) ] * len( inventory )
+
 
     def getPathname( self, aoi, _ ):
 
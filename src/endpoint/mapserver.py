@@ -1,7 +1,16 @@
 import os
+import pandas as pd
 import geopandas as gpd
 
-from endpoint.base import Endpoint
+from endpoint.base import Endpoint, STRING_DTYPE
+
+# single record inventory - geometry assigned per aoi
+_TEMPLATE = gpd.GeoDataFrame(   {   'platform' : pd.Categorical( [ 'misc' ] ),
+                                    'product' : pd.array( [ 'default' ], dtype=STRING_DTYPE ),
+                                    'acq_datetime' : pd.Series( [ pd.NaT ], dtype='datetime64[ns]' ),
+                                    'cloud_cover' : pd.Series( [ 0.0 ], dtype='float32' ) }, 
+                                geometry=[ None ], 
+                                crs='EPSG:4326' )
 
 class Mapserver ( Endpoint ):
 
@@ -15,6 +24,11 @@ class Mapserver ( Endpoint ):
         super().__init__( config, args )
         self._prefix = 'tile/1.0.0/World_Imagery/default'
 
+        # template uri constant across records
+        self._uri = "{root}/{prefix}/{tilematrixset}/{{z}}/{{y}}/{{x}}.jpeg".format (   root=config.uri,
+                                                                                        prefix=self._prefix,
+                                                                                        tilematrixset=config.tilematrixset  )
+
         return
 
 
@@ -24,15 +38,11 @@ class Mapserver ( Endpoint ):
         get catalog entries collocated with area of interest
         """
 
-        # create and append feature record
-        records = []
-        records.append ( {  'platform' : 'misc',
-                            'product' : 'default',
-                            'acq_datetime' : pd.NaT,
-                            'cloud_cover' : 0.0,
-                            'geometry' : aoi } )
+        # clone single record template - avoids geodataframe construction per aoi
+        inventory = _TEMPLATE.copy()
+        inventory[ 'geometry' ] = [ aoi ]
 
-        return  gpd.GeoDataFrame( records, crs='EPSG:4326' )
+        return inventory
         
         
 
@@ -42,10 +52,26 @@ class Mapserver ( Endpoint ):
         get template uri for inventory record
         """
 
-        # generate template uri including record feature id
-        return  "{root}/{prefix}/{tilematrixset}/{{z}}/{{y}}/{{x}}.jpeg".format (   root=self._config.uri,
-                                                                                    prefix=self._prefix,
-                                                                                    tilematrixset=self._config.tilematrixset  )
+        # template uri constant across records
+        return self._uri
+
+
+    def getUris( self, inventory ):
+
+        """
+        get template uris for all inventory records
+        """
+
+        return [ self._uri ] * len( inventory )
+
+
+    def getPathnames( self, aoi, inventory ):
+
+        """
+        get pathnames for all inventory records
+        """
+
+        return [ self.getPathname( aoi, None ) ] * len( inventory )
 
 
     def getPathname( self, aoi, _ ):
@@ -1,12 +1,13 @@
 import os
-import xmltodict
-import tempfile
+import shapely
+import functools
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from datetime import datetime
 
 from endpoint.wfs import WfsCatalog
-from endpoint.base import Endpoint
+from endpoint.base import Endpoint, STRING_DTYPE
+from lxml import etree
 from shapely.geometry import Polygon
 
 class Securewatch ( Endpoint ):
@@ -25,6 +26,16 @@ class Securewatch ( Endpoint ):
         self._credentials = config.credentials if 'credentials' in config else None
         self._catalog = Catalog( config )
 
+        # template uri up to record feature id
+        self._uri = "{root}{prefix}&CONNECTID={id}&LAYER={layer}&STYLE=_null&FORMAT=image/{img_format}&TileRow={{y}}&TileCol={{x}}" \
+                    "&TileMatrixSet={tilematrixset}&TileMatrix={tilematrixset}:{{z}}&CQL_FILTER=featureId='" \
+                        .format (   root=config.uri,
+                                    prefix=self._prefix,
+                                    img_format=config.format,
+                                    id=config.id,
+                                    layer=config.layer,
+                                    tilematrixset=config.get( 'tilematrix', config.get( 'tilematrixset' ) ) )
+
         # platform info lut
         self._platforms = { 'WV01' : 'WorldView-01', 
                             'GE01' : 'GeoEye-01', 
@@ -42,27 +53,26 @@ class Securewatch ( Endpoint ):
         """
 
         # get metadata of features (rasters) intersecting aoi
-        with tempfile.TemporaryDirectory() as tmp_path:
-            features = self._catalog.getFeatures( aoi.bounds, tmp_path )
-
-        # for each meta record
-        records = []
-        for feature in features:
-
-            if feature[ 'DigitalGlobe:source' ] in self._platforms:
-
-                # create and append feature record
-                footprint = self.getFootprint ( feature )
-                records.append ( {  'platform' : self._platforms[ feature[ 'DigitalGlobe:source' ]  ],
-                                    'uid' : feature[ 'DigitalGlobe:featureId' ],
-                                    'product' : feature[ 'DigitalGlobe:productType' ],
-                                    'acq_datetime' : datetime.strptime( feature[ 'DigitalGlobe:acquisitionDate' ], '%Y-%m-%d %H:%M:%S' ),
-                                    'cloud_cover' : float( feature[ 'DigitalGlobe:cloudCover' ] ) if 'DigitalGlobe:cloudCover' in feature else None,
-                                    'resolution' : self.getResolution ( feature ), 
-                                    'geometry' : footprint,
-                                    'overlap' : ( aoi.intersection( footprint ).area / aoi.area ) * 100 } )
-
-        return  gpd.GeoDataFrame( records, crs='EPSG:4326' ) if len( records ) > 0 else None
+        features = self._catalog.getFeatures( aoi.bounds )
+
+        # retain features acquired by supported platforms
+        features = [ feature for feature in features if feature[ 'source' ] in self._platforms ]
+        if len( features ) == 0:
+            return None
+
+        # compute footprints and aoi overlap in vectorized calls
+        footprints = [ self.getFootprint ( feature ) for feature in features ]
+        overlap = ( shapely.area( shapely.intersection( footprints, aoi ) ) / aoi.area ) * 100
+
+        # construct inventory from columns - compact dtypes fixed at build time for cheap filtering
+        return gpd.GeoDataFrame( {  'platform' : pd.Categorical( [ self._platforms[ feature[ 'source' ] ] for feature in features ] ),
+                                    'uid' : pd.array( [ feature[ 'featureId' ] for feature in features ], dtype=STRING_DTYPE ),
+                                    'product' : pd.array( [ feature[ 'productType' ] for feature in features ], dtype=STRING_DTYPE ),
+                                    'acq_datetime' : pd.to_datetime( [ feature[ 'acquisitionDate' ] for feature in features ], format='%Y-%m-%d %H:%M:%S' ).astype( 'datetime64[ns]' ),
+                                    'cloud_cover' : pd.to_numeric( [ feature[ 'cloudCover' ] for feature in features ], errors='coerce' ).astype( np.float32 ),
+                                    'resolution' : [ self.getResolution ( feature ) for feature in features ], 
+                                    'geometry' : footprints,
+                                    'overlap' : overlap }, crs='EPSG:4326' )
         
         
     def filterInventory( self, inventory ):
@@ -73,28 +83,30 @@ class Securewatch ( Endpoint ):
 
         # apply optional feature id condition
         if self._args.features is not None:
-            inventory = inventory [ ( pd.isnull( inventory[ 'uid' ] ) ) | 
-                                    ( inventory[ 'uid' ] in self._args.features ) ]
+            inventory = inventory.loc[  inventory[ 'uid' ].isna() | 
+                                        inventory[ 'uid' ].isin( set( self._args.features ) ) ]
 
         return inventory
 
 
+    def close( self ):
+
+        """
+        release catalog connections
+        """
+
+        self._catalog.close()
+        return
+
+
     def getUri( self, record ):
 
         """
         get template uri for inventory record
         """
 
-        # generate template uri including record feature id
-        return  "{root}{prefix}&CONNECTID={id}&LAYER={layer}&STYLE=_null&FORMAT=image/{img_format}&TileRow={{y}}&TileCol={{x}}" \
-                "&TileMatrixSet={tilematrixset}&TileMatrix={tilematrixset}:{{z}}&CQL_FILTER=featureId='{feature_id}'" \
-                    .format (   root=self._config.uri,
-                                prefix=self._prefix,
-                                img_format=self._config.format,
-                                id=self._config.id,
-                                layer=self._config.layer,
-                                tilematrixset=self._config.tilematrix,
-                                feature_id=record.uid )
+        # append record feature id to precompiled template
+        return self._uri + record.uid + "'"
 
     
     def getPathname( self, aoi, record ):
@@ -103,21 +115,56 @@ class Securewatch ( Endpoint ):
         get pathname 
         """
     
-        # first section - check null platrform
+        # append acquisition datetime if available
+        stamp = record.acq_datetime.strftime( '%Y%m%d_%H%M%S' ) if pd.notnull( record.acq_datetime ) else None
+        return self.formatPathname( aoi, record.platform, record.uid, stamp, record.acq_datetime.strftime( '%Y%m%d%H%M%S' ) )
+
+
+    def getUris( self, inventory ):
+
+        """
+        get template uris for all inventory records
+        """
+
+        # append feature ids to precompiled template in single column operation
+        return ( self._uri + inventory[ 'uid' ].astype( str ) + "'" ).tolist()
+
+
+    def getPathnames( self, aoi, inventory ):
+
+        """
+        get pathnames for all inventory records
+        """
+
+        # format datetime columns once
+        stamps = inventory[ 'acq_datetime' ].dt.strftime( '%Y%m%d_%H%M%S' ).tolist()
+        dates = inventory[ 'acq_datetime' ].dt.strftime( '%Y%m%d%H%M%S' ).tolist()
+
+        return [ self.formatPathname( aoi, platform, uid, stamp, date ) 
+                    for platform, uid, stamp, date in zip( inventory[ 'platform' ].tolist(), inventory[ 'uid' ].tolist(), stamps, dates ) ]
+
+
+    def formatPathname( self, aoi, platform, uid, stamp, date ):
+
+        """
+        construct pathname from record platform, feature id and formatted acquisition datetimes
+        """
+
+        # first section - check null platform
         out_path = aoi.name
-        if pd.notnull( record.platform ):
-            out_path = os.path.join( record.platform, aoi.name ) if self._args.dirs == 'platform' else os.path.join( aoi.name, record.platform )
+        if pd.notnull( platform ):
+            out_path = os.path.join( platform, aoi.name ) if self._args.dirs == 'platform' else os.path.join( aoi.name, platform )
 
         # append acquisition datetime if available
-        if pd.notnull( record.acq_datetime ):
-            out_path = os.path.join( out_path, record.acq_datetime.strftime( '%Y%m%d_%H%M%S' ) )
+        if pd.notnull( stamp ):
+            out_path = os.path.join( out_path, stamp )
 
         # construct unique filename
         filename = '{name}_{date}_{zoom}_{distance}_{uid}.TIF'.format ( name=aoi.name, 
-                                                                        date=record.acq_datetime.strftime( '%Y%m%d%H%M%S' ),
+                                                                        date=date,
                                                                         zoom=self._args.zoom, 
                                                                         distance=aoi.distance,
-                                                                        uid=record.uid )
+                                                                        uid=uid )
 
         return os.path.join( out_path, filename )
 
@@ -129,7 +176,7 @@ class Securewatch ( Endpoint ):
         """
 
         # map resolution string to source
-        return '0.31cm' if feature[ 'DigitalGlobe:source' ] in [ 'WV03_VNIR', 'WV04 '] else '0.46cm'
+        return '0.31cm' if feature[ 'source' ] in [ 'WV03_VNIR', 'WV04 '] else '0.46cm'
 
 
     def getFootprint( self, feature ):
@@ -142,15 +189,11 @@ class Securewatch ( Endpoint ):
         polygon = None
         try:
             
-            # convert string to points list
-            coords = [ float( x ) for x in feature[ 'DigitalGlobe:geometry' ][ 'gml:Polygon' ][ 'gml:exterior' ][ 'gml:LinearRing'][ 'gml:posList' ].split() ]
-            it = iter( coords )
+            # convert string to lat, lon array
+            points = np.fromstring( feature[ 'coordinates' ], sep=' ' ).reshape( -1, 2 )
 
-            points = list(zip(it, it))
-            points = [ (point[1], point[0]) for point in points ] 
-
-            # create shapely polygon
-            polygon = Polygon( points )
+            # create shapely polygon from lon, lat columns
+            polygon = Polygon( points[ :, ::-1 ] )
 
         except Exception as e:
             print ( 'getFootprint Exception: {}'.format( str( e ) ) )
@@ -173,6 +216,12 @@ class Catalog ( WfsCatalog ):
                         '&BBOX={{bbox}}'.format (   max_features=config.get( 'max_features', 500),
                                                     id=config.id )
         
+        # gml perimeter of feature footprint
+        self._coordinates = etree.XPath( './/*[local-name()="posList"]/text()' )
+
+        # feature fields consumed by endpoint
+        self._fields = ( 'source', 'sourceUnit', 'featureId', 'productType', 'acquisitionDate', 'cloudCover' )
+
         # blacklisted dataset types
         self._blacklist = { 'unit' : [ 'DEM' ], 
                             'source' : [ 'RS2' ] }
@@ -180,32 +229,42 @@ class Catalog ( WfsCatalog ):
         return
 
 
-    def getFeatures( self, bbox, out_path ):
+    def getFeatures( self, bbox ):
 
         """
         retrieve features (rasters) coincident with bbox
         """
 
+        features = []
+        try:
+
+            # neighbouring aois share cached catalog query
+            features = self.queryFeatures( tuple( round( x, 4 ) for x in bbox ) )
+
+        except Exception as e:
+            print ( 'Catalog Exception: {} (check credentials and connect id)'.format( str( e ) ) )
+
+        return features
+
+
+    @functools.lru_cache( maxsize=4096 )
+    def queryFeatures( self, bbox ):
+
+        """
+        query catalog for features (rasters) coincident with bbox
+        """
+
         features = []
 
         # append comma separated bbox coords and download file from uri
         bbox =  ( bbox[ 1 ], bbox[ 0 ], bbox[ 3 ], bbox[ 2 ] )
         uri = self._root.format( bbox=','.join( str( x ) for x in bbox ) )        
-        try:
 
-            # download feature meta data file 
-            self.downloadFeatures( uri, os.path.join ( out_path, 'features.xml' ) )
-            with open ( os.path.join ( out_path, 'features.xml' ) ) as fd:
-                doc = xmltodict.parse( fd.read() )
+        # stream feature schemas from meta data
+        for feature in self.iterFeatures( self.fetchFeaturesBytes( uri ), '{*}FinishedFeature', self._fields, self._coordinates ):
 
-                # extract and record feature schemas 
-                schemas = self.findItems( doc, 'DigitalGlobe:FinishedFeature' )                
-                for schema in schemas[ 0 ]:
-                    # filter out non-EO datasets / SAR datasets
-                    if schema[ 'DigitalGlobe:sourceUnit' ] not in self._blacklist[ 'unit' ] and schema[ 'DigitalGlobe:source' ] not in self._blacklist[ 'source' ]:
-                        features.append( schema )                
-
-        except Exception as e:
-            print ( 'Catalog Exception: {} (check credentials and connect id)'.format( str( e ) ) )
+            # filter out non-EO datasets / SAR datasets
+            if feature[ 'sourceUnit' ] not in self._blacklist[ 'unit' ] and feature[ 'source' ] not in self._blacklist[ 'source' ]:
+                features.append( feature )
 
         return features
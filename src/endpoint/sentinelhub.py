@@ -1,15 +1,20 @@
 import os
+import shapely
+import functools
 import pyproj
-import xmltodict
-import tempfile
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from datetime import datetime
 
 from endpoint.wfs import WfsCatalog
-from endpoint.base import Endpoint
+from endpoint.base import Endpoint, STRING_DTYPE
+from lxml import etree
 from shapely.geometry import Polygon
 
+# transformations shared across endpoint instances
+_GEO2WEB = pyproj.Transformer.from_crs( 4326, 3857, always_xy=True )
+_WEB2GEO = pyproj.Transformer.from_crs( 3857, 4326, always_xy=True )
+
 
 class Sentinelhub ( Endpoint ):
 
@@ -23,12 +28,18 @@ class Sentinelhub ( Endpoint ):
         super().__init__( config, args )        
         self._catalog = Catalog( config, args )
 
-        # create transformations
-        self._proj = { 'geo' : pyproj.Proj( init='epsg:4326', ellps='WGS84' ) }
-        self._proj[ 'web' ] =  pyproj.Proj( init='epsg:3857', ellps='WGS84' )
-
-        self._proj[ 'geo2web' ] = pyproj.Transformer.from_proj( self._proj[ 'geo' ], self._proj[ 'web' ] )
-        self._proj[ 'web2geo' ] = pyproj.Transformer.from_proj( self._proj[ 'web' ], self._proj[ 'geo' ] )
+        # template uri up to record acquisition date
+        self._uri = '{uri}/{id}?REQUEST=GetTile&TILEMATRIXSET={tilematrixset}' \
+                    '&LAYER={layer}' \
+                    '&MAXCC={max_cloud}' \
+                    '&FORMAT=image/{format}' \
+                    '&TILEMATRIX={{z}}&TILEROW={{y}}&TILECOL={{x}}' \
+                    '&TIME='.format (   uri=config.uri,
+                                        id=config.id,
+                                        tilematrixset=config.tilematrixset,
+                                        layer=config.layer,
+                                        max_cloud=args.max_cloud,
+                                        format=config.get( 'format', 'png' ) )
 
         return
 
@@ -39,32 +50,41 @@ class Sentinelhub ( Endpoint ):
         get catalog entries collocated with area of interest
         """
 
+        # transform latlon to web mercator 
+        b = aoi.bounds
+        xs, ys = _GEO2WEB.transform( [ b[ 0 ], b[ 2 ] ], [ b[ 1 ], b[ 3 ] ] )
+        bbox = [ xs[ 0 ], ys[ 0 ], xs[ 1 ], ys[ 1 ] ]
+
         # get metadata of features (rasters) intersecting aoi
-        with tempfile.TemporaryDirectory() as tmp_path:
+        features = self._catalog.getFeatures( bbox )
 
-            # transform latlon to web mercator 
-            bbox = list( self._proj[ 'geo2web' ].transform( aoi.bounds[ 0 ], aoi.bounds[ 1 ] ) )
-            bbox.extend( list ( self._proj[ 'geo2web' ].transform( aoi.bounds[ 2 ], aoi.bounds[ 3 ] ) ) )
+        if len( features ) == 0:
+            return None
 
-            features = self._catalog.getFeatures( bbox, tmp_path )
+        # compute footprints and aoi overlap in vectorized calls
+        footprints = [ self.getFootprint ( feature ) for feature in features ]
+        overlap = ( shapely.area( shapely.intersection( footprints, aoi ) ) / aoi.area ) * 100
 
-        # for each meta record
-        records = []
-        for feature in features:
+        # construct inventory from columns - compact dtypes fixed at build time for cheap filtering
+        ids = [ feature[ 'id' ] for feature in features ]
+        return gpd.GeoDataFrame( {  'platform' : pd.Categorical( [ uid.split( '_' )[ 0 ] for uid in ids ] ), 
+                                    'uid' : pd.array( ids, dtype=STRING_DTYPE ),
+                                    'cell' : pd.array( [ uid.split( '_' )[ -2 ] for uid in ids ], dtype=STRING_DTYPE ),
+                                    'product' : pd.array( [ self._config.layer ] * len( ids ), dtype=STRING_DTYPE ),
+                                    'acq_datetime' : pd.to_datetime( [ feature[ 'date' ] + ' ' + feature[ 'time' ] for feature in features ], format='%Y-%m-%d %H:%M:%S' ).astype( 'datetime64[ns]' ),
+                                    'cloud_cover' : pd.to_numeric( [ feature[ 'cloudCoverPercentage' ] for feature in features ] ).astype( np.float32 ),
+                                    'geometry' : footprints,
+                                    'overlap' : overlap }, crs='EPSG:4326' )
 
-            acq_datetime = datetime.strptime( feature[ 'date' ] + ' ' + feature[ 'time' ], '%Y-%m-%d %H:%M:%S' )
-            footprint = self.getFootprint ( feature )
 
-            records.append ( {  'platform' : feature[ 'id' ].split( '_' )[ 0 ], 
-                                'uid' : feature[ 'id' ],
-                                'cell' : feature[ 'id' ].split( '_')[-2],
-                                'product' : self._config.layer,
-                                'acq_datetime' : acq_datetime,
-                                'cloud_cover' : float ( feature[ 'cloudCoverPercentage' ] ),
-                                'geometry' : footprint,
-                                'overlap' : ( aoi.intersection( footprint ).area / aoi.area ) * 100 } )
+    def close( self ):
 
-        return  gpd.GeoDataFrame( records, crs='EPSG:4326' )
+        """
+        release catalog connections
+        """
+
+        self._catalog.close()
+        return
 
 
     def getUri( self, record ):
@@ -73,19 +93,9 @@ class Sentinelhub ( Endpoint ):
         get template uri for inventory record
         """
 
-        # generate template uri including record feature id
-        return  '{uri}/{id}?REQUEST=GetTile&TILEMATRIXSET={tilematrixset}' \
-                '&LAYER={layer}' \
-                '&MAXCC={max_cloud}' \
-                '&FORMAT=image/{format}' \
-                '&TILEMATRIX={{z}}&TILEROW={{y}}&TILECOL={{x}}' \
-                '&TIME={date}/{date}'.format (  uri=self._config.uri,
-                                                id=self._config.id,
-                                                tilematrixset=self._config.tilematrixset,
-                                                layer=self._config.layer,
-                                                max_cloud=self._args.max_cloud,
-                                                format=self._config.get( 'format', 'png' ),
-                                                date=record.acq_datetime.strftime('%Y-%m-%d') )
+        # append record acquisition date to precompiled template
+        date = record.acq_datetime.strftime('%Y-%m-%d')
+        return self._uri + date + '/' + date
 
 
     def getPathname( self, aoi, record ):
@@ -94,19 +104,55 @@ class Sentinelhub ( Endpoint ):
         get pathname 
         """
     
+        return self.formatPathname( aoi, 
+                                    record.cell, 
+                                    record.acq_datetime.strftime( '%Y%m%d_%H%M%S' ), 
+                                    record.acq_datetime.strftime( '%Y%m%d%H%M%S' ) )
+
+
+    def getUris( self, inventory ):
+
+        """
+        get template uris for all inventory records
+        """
+
+        # append acquisition dates to precompiled template in single column operation
+        dates = inventory[ 'acq_datetime' ].dt.strftime('%Y-%m-%d')
+        return ( self._uri + dates + '/' + dates ).tolist()
+
+
+    def getPathnames( self, aoi, inventory ):
+
+        """
+        get pathnames for all inventory records
+        """
+
+        # format datetime columns once
+        stamps = inventory[ 'acq_datetime' ].dt.strftime( '%Y%m%d_%H%M%S' ).tolist()
+        dates = inventory[ 'acq_datetime' ].dt.strftime( '%Y%m%d%H%M%S' ).tolist()
+
+        return [ self.formatPathname( aoi, cell, stamp, date ) 
+                    for cell, stamp, date in zip( inventory[ 'cell' ].tolist(), stamps, dates ) ]
+
+
+    def formatPathname( self, aoi, cell, stamp, date ):
+
+        """
+        construct pathname from record cell and formatted acquisition datetimes
+        """
+
         # construct unique filename
-        out_path = os.path.join( aoi.name, record.acq_datetime.strftime( '%Y%m%d_%H%M%S' ) )
+        out_path = os.path.join( aoi.name, stamp )
         filename = '{name}_{date}_{zoom}_{distance}_{layer}_{cell}.TIF'.format ( name=aoi.name, 
-                                                                        date=record.acq_datetime.strftime( '%Y%m%d%H%M%S' ),
+                                                                        date=date,
                                                                         zoom=self._args.zoom, 
                                                                         distance=aoi.distance,
                                                                         layer=self._config.layer,
-                                                                        cell=record.cell )
+                                                                        cell=cell )
 
         return os.path.join( out_path, filename )
 
 
-
     def getFootprint( self, feature ):
 
         """
@@ -117,20 +163,14 @@ class Sentinelhub ( Endpoint ):
         polygon = None
         try:
             
-            # convert string to points list
-            coords = feature[ 'geometryProperty' ][ 'gml:MultiPolygon' ][ 'gml:polygonMember' ][ 'gml:Polygon' ][ 'gml:outerBoundaryIs'][ 'gml:LinearRing'][ 'gml:coordinates']
-            coords = coords.replace( ',', ' ' )
-
-            coords = [ float( x ) for x in coords.split() ]
-            it = iter( coords )
+            # convert string to points array
+            points = np.fromstring( feature[ 'coordinates' ].replace( ',', ' ' ), sep=' ' ).reshape( -1, 2 )
 
-            # transform to geopgrahic
-            points = list(zip(it, it))
-            points = [ self._proj[ 'web2geo' ].transform( point[ 0 ], point[ 1 ] ) for point in points ] 
-            points = [ (point[1], point[0]) for point in points ] 
+            # transform all points to geographic in single call
+            xs, ys = _WEB2GEO.transform( points[ :, 0 ], points[ :, 1 ] )
 
             # create shapely polygon
-            polygon = Polygon( points )
+            polygon = Polygon( np.column_stack( [ ys, xs ] ) )
 
         except Exception as e:
             print ( 'getFootprint Exception: {}'.format( str( e ) ) )
@@ -149,6 +189,13 @@ class Catalog ( WfsCatalog ):
         # root url of wfs server
         super().__init__( config )
         self._typenames = 'S2.TILE'
+
+        # gml perimeter of feature footprint
+        self._coordinates = etree.XPath( './/*[local-name()="coordinates"]/text()' )
+
+        # feature fields consumed by endpoint
+        self._fields = ( 'id', 'date', 'time', 'cloudCoverPercentage' )
+
         self._root =    'https://services.sentinel-hub.com/ogc/wfs/{id}?' \
                         'REQUEST=GetFeature&srsName=EPSG:3857&TYPENAMES={typenames}' \
                         '&TIME={start_datetime}/{end_datetime}' \
@@ -161,29 +208,33 @@ class Catalog ( WfsCatalog ):
         return
 
 
-    def getFeatures( self, bbox, out_path ):
+    def getFeatures( self, bbox ):
 
         """
         retrieve features (rasters) coincident with bbox
         """
 
         features = []
-
-        # append comma separated bbox coords
-        uri = self._root.format( bbox=','.join( str( x ) for x in bbox ) )
         try:
 
-            # download feature meta data file 
-            self.downloadFeatures( uri, os.path.join ( out_path, 'features.xml' ) )
-            with open ( os.path.join ( out_path, 'features.xml' ) ) as fd:
-                doc = xmltodict.parse( fd.read() )
-
-                # extract and record feature schemas 
-                schemas = self.findItems( doc, self._typenames )
-                for schema in schemas:
-                    features.append( schema )                
+            # neighbouring aois share cached catalog query
+            features = self.queryFeatures( tuple( round( x, 4 ) for x in bbox ) )
 
         except Exception as e:
             print ( 'Meta Exception: {}'.format( str( e ) ) )
 
         return features
+
+
+    @functools.lru_cache( maxsize=4096 )
+    def queryFeatures( self, bbox ):
+
+        """
+        query catalog for features (rasters) coincident with bbox
+        """
+
+        # append comma separated bbox coords
+        uri = self._root.format( bbox=','.join( str( x ) for x in bbox ) )
+
+        # stream feature schemas from meta data
+        return list( self.iterFeatures( self.fetchFeaturesBytes( uri ), '{*}' + self._typenames, self._fields, self._coordinates ) )
@@ -1,8 +1,14 @@
+import io
 import os
-import requests
+import httpx
+
+from lxml import etree
 
 class WfsCatalog():
 
+    # http/2 client shared across catalogs - created on first request
+    _client = None
+
     def __init__( self, config ):
     
         """
@@ -11,75 +17,99 @@ class WfsCatalog():
 
         # copy args
         self._credentials = config.credentials if 'credentials' in config else None
+        self._debug_path = config.get( 'debug_path' )
+
+        # optionally create auth tuple - supplied per request as client is shared
+        self._auth = None
+        if self._credentials is not None:
+            self._auth = ( self._credentials.username, self._credentials.password )
+
         return
 
 
-    def downloadFeatures( self, uri, out_pathname ):
+    def __enter__( self ):
+        return self
+
+
+    def __exit__( self, *args ):
+        self.close()
+
+
+    @classmethod
+    def getClient( cls ):
 
         """
-        download feature info xml file
+        get shared http/2 client reused across catalog requests
         """
 
-        # create output path
-        if not os.path.exists( os.path.dirname ( out_pathname ) ):
-            os.makedirs( os.path.dirname ( out_pathname ) )
+        if WfsCatalog._client is None:
+            WfsCatalog._client = httpx.Client(  http2=True, 
+                                                timeout=30, 
+                                                limits=httpx.Limits( max_connections=32, max_keepalive_connections=16 ) )
 
-        # optionally create auth tuple
-        auth = None
-        if self._credentials is not None:
-            auth = ( self._credentials.username, self._credentials.password )
+        return WfsCatalog._client
 
-        # request catalog file from server
-        with requests.get(uri, auth=auth, stream=True) as r:
-            with open(out_pathname, 'w') as f:
-                f.write(r.text)
+
+    def close( self ):
+
+        """
+        release pooled connections
+        """
+
+        if WfsCatalog._client is not None:
+            WfsCatalog._client.close()
+            WfsCatalog._client = None
 
         return
 
-    def getItem( self, root, field ):
 
-        """              
-        get node value from xml schema
+    def fetchFeaturesBytes( self, uri ):
+
+        """
+        get feature info xml from server as bytes
         """
 
-        item = None
+        # request catalog content from server
+        r = self.getClient().get( uri, auth=self._auth )
+        r.raise_for_status()
+
+        # optionally dump xml to disk for debugging
+        if self._debug_path is not None:
 
-        # return first item in list else none
-        items = self.findItems( root, field )
-        if len( items ) > 0:
-            item = items[ 0 ]
+            if not os.path.exists( self._debug_path ):
+                os.makedirs( self._debug_path )
 
-        return item
+            with open( os.path.join( self._debug_path, 'features.xml' ), 'wb' ) as f:
+                f.write( r.content )
 
+        return r.content
 
-    def findItems( self, node, field ):
 
-        """              
-        recursively extract key values from dictionary
+    def iterFeatures( self, source, tag, fields, coordinates ):
+
+        """
+        stream feature elements from xml - yield dict of selected child element text keyed by local name
         """
 
-        # for all key value pairs
-        values = []
-        for key, value in node.items():
+        # parse matching elements incrementally - tolerate malformed server responses
+        for _, elem in etree.iterparse( io.BytesIO( source ), tag=tag, recover=True, huge_tree=False ):
 
-            # record value of key match
-            if key == field:
-                values.append( value )
+            # record text of selected immediate children only
+            feature = dict.fromkeys( fields )
+            for child in elem:
 
-            # recursive call on nested dict
-            elif isinstance( value, dict ):
-                results = self.findItems( value, field )
-                for result in results:
-                    values.append( result )
+                if isinstance( child.tag, str ):
+                    name = child.tag.rpartition( '}' )[ 2 ]
+                    if name in feature:
+                        feature[ name ] = child.text
 
-            # loop through contents in array
-            elif isinstance( value, list ):
-                for item in value:
+            # record perimeter coordinates
+            items = coordinates( elem )
+            feature[ 'coordinates' ] = items[ 0 ] if len( items ) > 0 else None
 
-                    # recursive call on nested dict
-                    if isinstance( item, dict ):
-                        results = self.findItems( item, field )
-                        for result in results:
-                            values.append( result )
+            # release processed elements to keep memory flat
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[ 0 ]
 
-        return values        
+            yield feature
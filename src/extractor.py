@@ -1,18 +1,29 @@
 import os
-import json
-import pandas as pd
+import numpy as np
+import shapely
 import geopandas as gpd
 
 from aoi import Aoi
 from osgeo import ogr
 from downloader import Downloader
-from shapely.geometry import shape
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
 
 from endpoint.mapserver import Mapserver
 from endpoint.sentinelhub import Sentinelhub
 from endpoint.securewatch import Securewatch
 from endpoint.earthservice import Earthservice
 
+# endpoint classes keyed by configuration name
+_ENDPOINTS = {  'mapserver' : Mapserver, 
+                'sentinelhub' : Sentinelhub, 
+                'securewatch' : Securewatch, 
+                'earthservice' : Earthservice }
+
 class Extractor:
 
     def __init__( self, config, args ):
@@ -22,9 +33,11 @@ class Extractor:
         """
 
         # create endpoint 
-        _class = globals()[ str( config.endpoint.name ).capitalize() ]  
-        
-        self._endpoint = _class ( config.endpoint, args )        
+        name = str( config.endpoint.name ).lower()
+        if name not in _ENDPOINTS:
+            raise KeyError ( 'unknown endpoint {}: expected one of {}'.format( name, ', '.join( _ENDPOINTS ) ) )
+
+        self._endpoint = _ENDPOINTS[ name ]( config.endpoint, args )        
         self._downloader = Downloader( config.endpoint )
 
         return
@@ -72,59 +85,103 @@ class Extractor:
         root_path = os.path.join( args.out_path, config.endpoint.name )
         aois = self.getAoIs( config.aoi )
 
-        # check valid aois
-        if aois is not None:
-            
-            # for each aoi
-            for aoi in aois.itertuples():
+        # output folders already created during this run
+        created = set()
+
+        # single download worker - catalog query of next aoi overlaps downloads of current aoi
+        pool = ThreadPoolExecutor( max_workers=1 )
+        pending = None
 
-                # get image inventory collocated with aoi
-                inventory = self._endpoint.getInventory( aoi.geometry )
-                if inventory is not None:
+        try:
+
+            # check valid aois
+            if aois is not None:
                 
-                    # print available scenes
-                    self.printInventory( f'Image Inventory for AoI: {aoi.name}', inventory )
-
-                    # apply filter constraints
-                    inventory = self.filterInventory( inventory, args )
-                    self.printInventory( f'Filtered Image Inventory for AoI: {aoi.name}', inventory )
-
-                    # break on info only
-                    if args.info_only:
-                        continue
-
-                    # manage downloads
-                    downloads = 0
-                    for record in inventory.itertuples():
-
-                        # construct out pathname
-                        out_pathname = os.path.join( root_path, self._endpoint.getPathname( aoi, record ) )
-                        
-                        # check pathname exists or overwrite 
-                        if not os.path.exists( out_pathname ) or args.overwrite:
+                # for each aoi
+                for aoi in aois.itertuples():
+
+                    # get image inventory collocated with aoi
+                    inventory = self._endpoint.getInventory( aoi.geometry )
+                    if inventory is not None:
                     
-                            if not os.path.exists( os.path.dirname ( out_pathname ) ):
-                                os.makedirs( os.path.dirname ( out_pathname ) )
+                        # print available scenes
+                        self.printInventory( f'Image Inventory for AoI: {aoi.name}', inventory )
+
+                        # apply filter constraints
+                        inventory = self.filterInventory( inventory, args )
+                        self.printInventory( f'Filtered Image Inventory for AoI: {aoi.name}', inventory )
+
+                        # break on info only or nothing to download - no per-record work
+                        if args.info_only or inventory.empty or args.max_downloads == 0:
+                            continue
+
+                        # manage downloads
+                        downloads = 0; jobs = []
+
+                        # get uris and pathnames of all records in column-wise pass
+                        uris = self._endpoint.getUris( inventory )
+                        pathnames = self._endpoint.getPathnames( aoi, inventory )
 
-                            # retrieve images aligned with constraints            
-                            print ( f'downloading : {out_pathname}' )
-                            self._downloader.process(   self._endpoint.getUri( record ),
-                                                        aoi, 
-                                                        args, 
-                                                        out_pathname )
-                            print ( '... OK!' )
+                        for uri, pathname in zip( uris, pathnames ):
 
-                        else:
+                            # construct out pathname
+                            out_pathname = os.path.join( root_path, pathname )
+                            
+                            # check overwrite or pathname exists - single syscall 
+                            if args.overwrite or not os.path.lexists( out_pathname ):
 
-                            # output file already exists - ignore
-                            print ( f'output file already exists: {out_pathname}' )
+                                # create folder once per run
+                                out_path = os.path.dirname( out_pathname )
+                                if out_path not in created:
+                                    os.makedirs( out_path, exist_ok=True )
+                                    created.add( out_path )
 
-                        # check downloads vs max downloads
-                        downloads += 1
-                        if args.max_downloads is not None and downloads >= args.max_downloads:
-                            print ( f'... exiting after {downloads} downloads' )
-                            break
+                                # queue retrieval of images aligned with constraints            
+                                print ( f'downloading : {out_pathname}' )
+                                jobs.append( ( uri, aoi, args, out_pathname ) )
 
+                            else:
+
+                                # output file already exists - ignore
+                                print ( f'output file already exists: {out_pathname}' )
+
+                            # check downloads vs max downloads
+                            downloads += 1
+                            if args.max_downloads is not None and downloads >= args.max_downloads:
+                                print ( f'... exiting after {downloads} downloads' )
+                                break
+
+                        # download tiles of all queued records in single pass - at most one aoi in flight
+                        if len( jobs ) > 0:
+                            self.waitDownloads( pending )
+                            pending = ( pool.submit( self._downloader.processMany, jobs ), jobs )
+
+            # complete outstanding downloads
+            self.waitDownloads( pending )
+
+        finally:
+
+            # release worker, endpoint and downloader resources
+            pool.shutdown()
+            self._endpoint.close()
+            self._downloader.close()
+
+        return
+
+
+    def waitDownloads( self, pending ):
+
+        """
+        block until submitted aoi downloads complete - report outcome of each queued job
+        """
+
+        if pending is not None:
+
+            future, jobs = pending
+            merged = set( future.result() )
+
+            for _, _, _, out_pathname in jobs:
+                print ( f'... OK! {out_pathname}' if out_pathname in merged else f'... FAILED! {out_pathname}' )
 
         return
 
@@ -139,27 +196,68 @@ class Extractor:
         aois = []
         try:
 
-            # open geometries pathname
-            ds = ogr.Open( config.pathname )
-            if ds is not None:
+            # read geometries and attributes of whole layer
+            geoms, properties = self.readLayer( config )
+            for idx, ( geom, props ) in enumerate( zip( geoms, properties ) ):
 
-                # convert ogr feature to shapely object
-                layer = ds.GetLayer( 0 )
-                for idx, feature in enumerate( layer ):
-                    
-                    # create aoi object
-                    config.name = f'aoi-{idx}'
-                    aois.append( Aoi.fromOgrFeature( feature, config ) )
-            else:
-                # file not found
-                raise Exception ( 'pathname not found' )
+                # create aoi object
+                config.name = f'aoi-{idx}'
+                aois.append( Aoi.fromGeometry( geom, props, config ) )
 
         # error processing aoi feature
         except Exception as e:
             print ( 'AoI Exception {}: -> {}'.format( str( e ), config.pathname ) )
             aois.clear()
 
-        return gpd.GeoDataFrame( aois, crs='EPSG:4326', geometry='geometry' ) if len( aois ) > 0 else None
+        if len( aois ) == 0:
+            return None
+
+        # construct geodataframe column-wise
+        columns = { key : [ aoi[ key ] for aoi in aois ] for key in aois[ 0 ] }
+        return gpd.GeoDataFrame( columns, crs='EPSG:4326', geometry='geometry' )
+
+
+    def readLayer( self, config ):
+
+        """
+        read geometries and feature properties from first layer of file
+        """
+
+        # read whole layer in single batch where available
+        if pyogrio is not None:
+
+            # geometry column decoded in single call
+            try:
+                gdf = pyogrio.read_dataframe( config.pathname, layer=0 )
+            except pyogrio.errors.DataSourceError:
+                raise Exception ( 'pathname not found' )
+
+            geoms = gdf.geometry.to_list() if 'geometry' in gdf else [ None ] * len( gdf )
+
+            # layer without attribute fields - one empty property dict per feature as with ogr
+            df = gdf.drop( columns='geometry', errors='ignore' ).astype( object )
+            if len( df.columns ) == 0:
+                return geoms, [ {} for _ in range( len( gdf ) ) ]
+
+            # missing attribute values reported as none - consistent with ogr
+            return geoms, df.where( df.notna(), None ).to_dict( 'records' )
+
+        # open geometries pathname
+        ds = ogr.Open( config.pathname )
+        if ds is None:
+            # file not found
+            raise Exception ( 'pathname not found' )
+
+        # collect wkb and attributes per feature
+        wkbs = []; properties = []
+        for feature in ds.GetLayer( 0 ):
+
+            geom = feature.GetGeometryRef()
+            wkbs.append( bytes( geom.ExportToWkb() ) if geom is not None else None )
+            properties.append( feature.items() )
+
+        # convert wkb to shapely objects in single vectorized call
+        return shapely.from_wkb( wkbs ).tolist(), properties
 
 
     def printInventory( self, title, inventory ):
@@ -168,17 +266,12 @@ class Extractor:
         print inventory of images collocated with aoi
         """
 
-        # set options
+        # print title
         print ( title )
         if len( inventory ) > 0:
 
-            with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.expand_frame_repr', False, 'max_colwidth', -1 ):  
-
-                # print all columns apart from geoemetry 
-                columns = inventory.columns.to_list()
-                columns.remove( 'geometry' )
-
-                print( inventory[ columns ] )
+            # print all rows and columns apart from geometry - formatted in single call without global options
+            print( inventory.drop( columns='geometry' ).to_string( max_rows=None, max_cols=None, max_colwidth=None ) )
         else:
             
             # report empty inventory in readable way
@@ -193,25 +286,31 @@ class Extractor:
         filter image inventory on user-defined conditions passed via command line
         """
 
+        # collect predicates as raw boolean arrays - applied in single selection
+        masks = []
+
         # apply start datetime condition
         if args.start_datetime is not None:
-            inventory = inventory [ ( pd.isnull( inventory[ 'acq_datetime' ] ) ) | 
-                                    ( inventory[ 'acq_datetime' ] >= args.start_datetime ) ]
+            masks.append( inventory[ 'acq_datetime' ].isna().values | 
+                            ( np.asarray( inventory[ 'acq_datetime' ].values ) >= np.datetime64( args.start_datetime ) ) )
 
         # apply end datetime condition
         if args.end_datetime is not None:
-            inventory = inventory [ ( pd.isnull( inventory[ 'acq_datetime' ] ) ) | 
-                                    ( inventory[ 'acq_datetime' ] <= args.end_datetime ) ]
+            masks.append( inventory[ 'acq_datetime' ].isna().values | 
+                            ( np.asarray( inventory[ 'acq_datetime' ].values ) <= np.datetime64( args.end_datetime ) ) )
 
         # apply max cloud coverage condition
         if args.max_cloud is not None:
-            inventory = inventory [ ( pd.isnull( inventory[ 'cloud_cover' ] ) ) | 
-                                    ( inventory[ 'cloud_cover' ] <= args.max_cloud ) ]
+            masks.append( inventory[ 'cloud_cover' ].isna().values | 
+                            ( inventory[ 'cloud_cover' ].values <= args.max_cloud ) )
 
         # apply platform condition
         if args.platforms is not None:
-            inventory = inventory [ ( pd.isnull( inventory[ 'platform' ] ) ) | 
-                                    ( inventory[ 'platform' ].isin ( args.platforms ) ) ]
+            masks.append( inventory[ 'platform' ].isna().values | 
+                            inventory[ 'platform' ].isin( set( args.platforms ) ).values )
+
+        if len( masks ) > 0:
+            inventory = inventory.loc[ np.logical_and.reduce( masks ) ]
 
         # endpoint specific filtering
         return self._endpoint.filterInventory( inventory )
@@ -0,0 +1,47 @@
+import math
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+# eager signatures - kernels compiled or loaded from cache at import so first call pays no jit warmup
+_CONVERT_SIG = 'UniTuple( float64, 2 )( float64, float64, float64, float64, float64 )'
+
+
+def jit( signature ):
+
+    """
+    compile scalar kernel to native code for typed signature where numba available - else run as plain python
+    """
+
+    def decorate( func ):
+        return njit( signature, cache=True )( func ) if njit is not None else func
+
+    return decorate
+
+
+@jit( _CONVERT_SIG )
+def latlon_to_meters( lat, lon, deg2merc, deg2rad, rad2merc ):
+
+    """
+    convert wgs84 lat/lon to spherical mercator xy - inverse gudermannian asinh( tan ) form
+    """
+
+    mx = lon * deg2merc
+    my = math.asinh( math.tan( lat * deg2rad ) ) * rad2merc
+    return mx, my
+
+
+@jit( _CONVERT_SIG )
+def meters_to_latlon( mx, my, merc2deg, merc2rad, rad2deg ):
+
+    """
+    convert spherical mercator xy to wgs84 lat/lon - gudermannian atan( sinh ) form
+    """
+
+    lon = mx * merc2deg
+    lat = rad2deg * math.atan( math.sinh( my * merc2rad ) )
+    return lat, lon
+
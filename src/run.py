@@ -5,6 +5,7 @@ import argparse
 from munch import munchify
 from datetime import datetime
 from extractor import Extractor
+from downloader import SPILL_TO_DISK
 
 
 def validDateTimeArgument ( arg ):
@@ -49,7 +50,8 @@ def parseArguments(args=None):
     parser.add_argument('--max_downloads', type=int, help='max compliant downloads for aoi', default=None )
     parser.add_argument('--dirs', help='path structure', action='store_true', default=None )
     parser.add_argument('--format', help='output image format', default='GTIFF' )
-    parser.add_argument('--options', help='output image creation options', default="TILED=YES COMPRESS=LZW" )
+    parser.add_argument('--options', help='output image creation options', default="TILED=YES BLOCKXSIZE=512 BLOCKYSIZE=512 COMPRESS=DEFLATE NUM_THREADS=ALL_CPUS" )
+    parser.add_argument('--spill_to_disk', type=int, help='max size (MB) of in-memory tiles before writing to disk', default=SPILL_TO_DISK )
 
     return parser.parse_args(args)
 
@@ -1,154 +1,350 @@
 import os
-import time
 import random
-import requests
-import shutil
-
-from tiler import SlippyTiler
-from threading import Thread
+import asyncio
+import aiohttp
+import functools
+import numpy as np
 
 from osgeo import gdal
-from shapely import geometry
-from shapely.ops import transform
-
+from writer import createWriter, removeFile
+from concurrent.futures import ThreadPoolExecutor
+import shapely
 import pyproj
 
-class TileScraper( Thread ):
+# geographic to mercator transformation shared across scrapers
+_GEO2WEB = pyproj.Transformer.from_crs( 'EPSG:4326', 'EPSG:3857', always_xy=True )
+
+
+# transient http status codes worth retrying
+RETRY_STATUS = frozenset( ( 429, 500, 502, 503, 504 ) )
+
+
+def getRetryDelay( headers, tries, backoff_factor=0.5, max_delay=60.0 ):
+
+    """
+    get retry interval - honour retry-after header else exponential backoff with jitter
+    """
+
+    if headers is not None:
+
+        # retry-after given in seconds - http-date form ignored
+        try:
+            return min( max( float( headers.get( 'Retry-After' ) ), 0.0 ), max_delay )
+        except ( TypeError, ValueError ):
+            pass
+
+    return min( backoff_factor * ( 2 ** ( tries - 1 ) ) + random.random() * backoff_factor, max_delay )
+
+
+async def download_tile( session, sem, uri, pathname, writer, max_tries=5, verbose=False ):
+
+    """
+    get tile image from https url - retry transient errors with exponential backoff
+    """
+
+    # already exists on file system
+    if os.path.exists ( pathname ):
+        return pathname
+
+    # retry counters
+    tries = 1
+    while tries <= max_tries:
+
+        headers = None
+        try:
+
+            # writeback if enabled
+            if verbose:
+                print ( '{} -> {}'. format( uri, pathname ) )
+
+            # bounded number of requests in flight over shared session
+            async with sem, session.get( uri ) as r:
+                r.raise_for_status()
+                content = await r.read()
+
+            # write tile image - return location of stored tile
+            return await writer.submit( pathname, content )
+
+        except Exception as e:
+
+            print ( 'Download Exception {}: {} -> {}'.format( str( e ), uri, pathname ) )
+            if isinstance( e, aiohttp.ClientResponseError ):
+
+                # client error other than rate limiting - unrecoverable
+                if e.status not in RETRY_STATUS:
+                    break
+
+                headers = e.headers
+
+        # increment retry counter - wait for server-defined or exponentially increasing interval
+        if tries < max_tries:
+            await asyncio.sleep ( getRetryDelay( headers, tries ) )
+
+        tries += 1
+
+    # delete file if download failed
+    if os.path.exists( pathname ):
+        os.remove( pathname )
+
+    return None
 
-    def __init__( self, idx, tasks, config, verbose=False ):
+
+class TaskBatch:
+
+    __slots__ = ( 'xs', 'ys', 'zoom', 'uris', 'pathnames' )
+
+    def __init__( self, xs, ys, zoom, uris, pathnames ):
 
         """
-        constructor
+        constructor - tile download tasks held as parallel arrays
         """
 
-        # init base
-        Thread.__init__(self)
+        # copy arguments
+        self.xs = np.asarray( xs, dtype=np.int32 )
+        self.ys = np.asarray( ys, dtype=np.int32 )
+        self.zoom = zoom
 
-        # copy arguments    
-        self._idx = idx
-        self._tasks = tasks
+        self.uris = uris
+        self.pathnames = pathnames
 
-        self._tiler = config[ 'tiler' ]
-        self._options = config[ 'options' ]
-        self._credentials = config[ 'credentials' ]        
+        return
+
+
+    def __len__( self ):
+        return len( self.xs )
+
+
+    def take( self, indices ):
+
+        """
+        get batch of tasks at indices
+        """
+
+        return TaskBatch(   self.xs[ indices ], 
+                            self.ys[ indices ], 
+                            self.zoom, 
+                            [ self.uris[ idx ] for idx in indices ], 
+                            [ self.pathnames[ idx ] for idx in indices ] )
+
+
+class TileFetcher:
+
+    def __init__( self, credentials, connections=1, workers=None, verbose=False ):
+
+        """
+        constructor - event loop, http session and writer reused across aois
+        """
+
+        # copy arguments
+        self._credentials = credentials
+        self._connections = connections
         self._verbose = verbose
 
-        # config geometry
-        self._geometry = None 
-        if 'geometry' in config:
-            
-            self._geometry = config[ 'geometry' ]
+        # resources created on first fetch
+        self._loop = asyncio.new_event_loop()
+        self._session = None
+        self._sem = None
+        self._writer = None
+
+        # gdal releases gil - pool of workers post-processes downloaded tiles while further tiles in flight
+        self._executor = ThreadPoolExecutor( max_workers=workers )
+
+        return
 
-            # reproject aoi from geographic to mercator
-            project = pyproj.Transformer.from_proj(
-                            pyproj.Proj(init='epsg:4326'),
-                            pyproj.Proj(init='epsg:3857'))
 
-            self._geometry = transform(project.transform, self._geometry ) 
+    def fetch( self, batches, memory_limit=None, handlers=None ):
 
-        self._tiles = []
+        """
+        download batches of tiles in single pass - return location of each stored tile or none per batch
+        optional per-batch handler( idx, location ) applied to each stored tile in worker thread - result returned in place of location
+        """
+
+        if handlers is None:
+            handlers = [ None ] * len( batches )
+
+        locations = self._loop.run_until_complete( self._gather( batches, memory_limit, handlers ) )
+
+        # split locations back into batches
+        results = []; offset = 0
+        for batch in batches:
+            results.append( locations[ offset : offset + len( batch ) ] )
+            offset += len( batch )
+
+        return results
+
+
+    async def _task( self, uri, pathname, handler, idx ):
+
+        """
+        download tile and hand stored tile to handler
+        """
+
+        location = await download_tile( self._session, self._sem, uri, pathname, self._writer, verbose=self._verbose )
+        if location is not None and handler is not None:
+            location = await self._loop.run_in_executor( self._executor, handler, idx, location )
+
+        return location
+
+
+    async def _gather( self, batches, memory_limit, handlers ):
+
+        """
+        download tiles over shared http session with bounded concurrency
+        """
+
+        if self._session is None:
+
+            # optionally create auth object
+            auth = None
+            if self._credentials is not None:
+                auth = aiohttp.BasicAuth( self._credentials[ 'username' ], self._credentials[ 'password' ] )
+
+            # limit connections and requests in flight
+            self._sem = asyncio.Semaphore( self._connections )
+            connector = aiohttp.TCPConnector( limit=self._connections, ttl_dns_cache=300 )
+
+            self._session = aiohttp.ClientSession( connector=connector, auth=auth )
+            self._writer = createWriter()
+
+        # keep tiles in memory - spill to disk beyond limit
+        self._writer.reset( memory_limit )
+        return await asyncio.gather( *[ self._task( uri, pathname, handler, idx ) 
+                                            for batch, handler in zip( batches, handlers )
+                                            for idx, ( uri, pathname ) in enumerate( zip( batch.uris, batch.pathnames ) ) ] )
+
+
+    def close( self ):
+
+        """
+        release http session, writer, worker threads and event loop
+        """
+
+        if self._session is not None:
+
+            self._loop.run_until_complete( self._session.close() )
+            self._writer.close()
+
+            self._session = None
+
+        self._executor.shutdown()
+        self._loop.close()
         return
 
 
-    def run( self ):
+class TileScraper:
+
+    def __init__( self, config ):
 
         """
         constructor
         """
 
-        # for each task
-        for task in self._tasks:
+        # copy arguments
+        self._tiler = config[ 'tiler' ]
+        self._options = config[ 'options' ]
+
+        # tokenise translation options once - per tile georeference appended as list
+        self._translate_options = [ '-of', 'VRT', '-a_srs', self._tiler.proj ]
+        self._extra_options = gdal.ParseCommandLine( self._options ) if self._options is not None else []
 
-            # get bounds
-            s,w,n,e = self._tiler.TileBounds( *( task[ 'xyz' ] ) )
-            intersects = True
+        # config geometry
+        self._geometry = config.get( 'geometry' )
+        if self._geometry is not None:
 
-            # compute intersection between tile aoi and geometry
-            if self._geometry is not None:
-                bbox = geometry.Polygon( [  [ w, n ], 
-                                            [ e, n ], 
-                                            [ e, s ],
-                                            [ w, s ],
-                                            [ w, n ] ] )
+            # reproject aoi vertices from geographic to mercator in single call
+            coords = shapely.get_coordinates( self._geometry )
+            xs, ys = _GEO2WEB.transform( coords[ :, 0 ], coords[ :, 1 ] )
 
-                intersects = bbox.intersects( self._geometry )
+            self._geometry = shapely.set_coordinates( self._geometry, np.column_stack( [ xs, ys ] ) )
 
-            # if intersection exists
-            if intersects:
+            # cache edge index for repeated tile intersection tests
+            shapely.prepare( self._geometry )
 
-                # download tile
-                self.getTile( task[ 'uri' ], task[ 'pathname'] )
-                if os.path.exists ( task[ 'pathname' ] ):
+            # bounds test exact for axis-aligned rectangular aoi
+            self._bounds = self._geometry.bounds
+            self._rectangular = bool( shapely.equals( self._geometry, shapely.envelope( self._geometry ) ) )
 
-                    # open newly created tile with gdal
-                    ds = gdal.Open( task[ 'pathname'] )
-                    if ds is not None:
+        return
 
-                        # setup geotiff translation options
-                        options = '-of GTiff -co compress=lzw '                    
-                        options += '-a_srs "{}" -a_ullr {} {} {} {} '.format ( self._tiler._proj, w, n, e, s )
-                        
-                        if self._options is not None:
-                            options += self._options
 
-                        try:
+    def select( self, batch ):
 
-                            # translate png / jpg into geotiff
-                            pathname = os.path.splitext( task[ 'pathname'] )[ 0 ] + '.tif'
-                            ds = gdal.Translate( pathname, ds, options=options )
-                            ds = None
+        """
+        discard tiles outside of geometry prior to download
+        """
 
-                            # record pathname of newly created image
-                            self._tiles.append( pathname )
+        # no geometry - assume rectangular aoi
+        if self._geometry is None or len( batch ) == 0:
+            return batch
 
-                        except Exception as e:
+        # compute bounds of all tiles in single vectorized pass
+        s, w, n, e = self._tiler.TileBoundsVec( batch.xs, batch.ys, batch.zoom )
 
-                            # translation error
-                            print ( 'Translation Exception: {}'.format( str( e ) ) )
+        # filter - discard tiles outside geometry bounds with plain array arithmetic
+        minx, miny, maxx, maxy = self._bounds
+        mask = ( e >= minx ) & ( w <= maxx ) & ( n >= miny ) & ( s <= maxy )
 
-        return
+        # refine - intersect remaining tiles with geometry unless bounds test is exact
+        if not self._rectangular:
+
+            idx = np.flatnonzero( mask )
+            mask[ idx ] = shapely.intersects( shapely.box( w[ idx ], s[ idx ], e[ idx ], n[ idx ] ), self._geometry )
 
+        return batch.take( np.flatnonzero( mask ) )
 
-    def getTile( self, uri, pathname ):
+
+    def getHandler( self, batch ):
 
         """
-        get tile image from https url
+        get handler georeferencing downloaded tiles of batch
         """
 
-        # already exists on file system 
-        if not os.path.exists ( pathname ):
+        return functools.partial( self.translate, batch )
 
-            # retry counters
-            tries = 1; max_tries = 3
-            while tries <= max_tries:
 
-                try:
+    def translate( self, batch, idx, location ):
 
-                    # writeback if enabled
-                    if self._verbose:
-                        print ( '{}: {} -> {}'. format( self._idx, uri, pathname ) )
+        """
+        georeference downloaded tile - return ( vrt, source tile ) pair retained until mosaic complete
+        """
 
-                    # optionally create auth tuple
-                    auth=None
-                    if self._credentials is not None:
-                        auth = (self._credentials[ 'username'], self._credentials[ 'password' ])
+        pathname = self.translateTile( int( batch.xs[ idx ] ), int( batch.ys[ idx ] ), batch.zoom, location )
+        if pathname is None:
 
-                    # use requests to get tile image
-                    with requests.get( uri, auth=auth, stream=True) as r:
-                        with open( pathname, 'wb') as f:
-                            shutil.copyfileobj(r.raw, f)
+            # discard unreadable png / jpg tile
+            removeFile( location )
+            return None
 
-                    break
+        return pathname, location
+
+
+    def translateTile( self, x, y, zoom, location ):
+
+        """
+        wrap downloaded png / jpg tile in georeferenced vrt - pixels read once during mosaicking
+        """
+
+        pathname = None
+
+        # open newly created tile with gdal - in-memory unless spilled to disk
+        ds = gdal.Open( location )
+        if ds is not None:
+
+            # setup vrt translation options
+            s,w,n,e = self._tiler.TileBounds( x, y, zoom )
+            options = self._translate_options + [ '-a_ullr', str( w ), str( n ), str( e ), str( s ) ] + self._extra_options
+
+            try:
 
-                except Exception as e:
+                # write vrt alongside source tile
+                pathname = os.path.splitext( location )[ 0 ] + '.vrt'
+                ds = gdal.Translate( pathname, ds, options=options )
+                ds = None
 
-                    # increment retry counter - wait for random interval
-                    print ( 'Download Exception {}: {} -> {}'.format( str( e ), uri, pathname ) )
-                    tries += 1
-                    time.sleep ( random.randrange( 5 ) )
+            except Exception as e:
 
-            # delete file if download failed 
-            if tries > max_tries:
-                os.remove( pathname )
+                # translation error
+                print ( 'Translation Exception: {}'.format( str( e ) ) )
+                pathname = None
 
-        return 
+        return pathname
@@ -1,4 +1,73 @@
 import math
+import kernels
+import functools
+import numpy as np
+
+from typing import NamedTuple
+
+# deepest zoom level held in lookup tables
+MAX_ZOOM = 30
+
+# tile size independent spherical mercator constants - reciprocal scale factors reduce conversions to multiplies
+_ORIGIN_SHIFT = 2 * math.pi * 6378137 / 2.0
+# 20037508.342789244
+_DEG2MERC = _ORIGIN_SHIFT / 180.0
+_MERC2DEG = 180.0 / _ORIGIN_SHIFT
+_DEG2RAD = math.pi / 180.0
+_RAD2DEG = 180.0 / math.pi
+_RAD2MERC = _ORIGIN_SHIFT / math.pi
+_MERC2RAD = math.pi / _ORIGIN_SHIFT
+
+# proj4 definitions shared by all tiler instances
+_MERC_PROJ = '+proj=merc +a=6378137 +b=6378137 +lat_ts=0.0 +lon_0=0.0 +x_0=0.0 +y_0=0 +k=1.0 +units=m +nadgrids=@null +no_defs'
+_SLIPPY_PROJ = '+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs'
+
+# quadkey digit pairs encoded by each hex digit of morton code
+_HEX_TO_QUAD = { ord( '{:x}'.format( h ) ) : '{}{}'.format( h >> 2, h & 3 ) for h in range( 16 ) }
+
+def _tabulated( table, zoom ):
+    "Returns entry of zoom indexed lookup table - None if zoom not an integer level in 0..MAX_ZOOM"
+
+    # explicit range check - negative zoom would otherwise wrap to end of table
+    try:
+        if 0 <= zoom <= MAX_ZOOM:
+            return table[ zoom ]
+    except ( TypeError, ValueError ):
+        pass
+
+    return None
+
+def _spreadBits( v ):
+    "Spreads bits of 32-bit integer to even bit positions"
+
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    v = (v | (v << 1)) & 0x5555555555555555
+    return v
+
+@functools.lru_cache( maxsize=4096 )
+def _latLonToMeters( lat, lon ):
+    "Caches Spherical Mercator XY of scalar lat/lon - invariant across zoom levels"
+
+    return kernels.latlon_to_meters( lat, lon, _DEG2MERC, _DEG2RAD, _RAD2MERC )
+
+class MercBounds( NamedTuple ):
+    "Tile bounds in EPSG:900913 metres - south, west, north, east order as returned by TileBounds"
+
+    miny: float
+    minx: float
+    maxy: float
+    maxx: float
+
+class Bounds( NamedTuple ):
+    "Tile bounds in WGS84 degrees - south, west, north, east order"
+
+    minLat: float
+    minLon: float
+    maxLat: float
+    maxLon: float
 
 class MercatorTiler(object):
 
@@ -99,56 +168,91 @@ class MercatorTiler(object):
                  AUTHORITY["EPSG","9001"]]]
     """
 
+    __slots__ = ( '_tileSize', '_initialResolution', '_resolution_table', '_tile_span_table' )
+
     def __init__(self, tileSize=256):
         "Initialize the TMS Global Mercator pyramid"
         self._tileSize = tileSize
         self._initialResolution = 2 * math.pi * 6378137 / self._tileSize
         # 156543.03392804062 for tileSize 256 pixels
-        self._originShift = 2 * math.pi * 6378137 / 2.0
-        # 20037508.342789244
 
-        self._proj = '+proj=merc +a=6378137 +b=6378137 +lat_ts=0.0 +lon_0=0.0 +x_0=0.0 +y_0=0 +k=1.0 +units=m +nadgrids=@null +no_defs'
+        # zoom indexed resolution lookup table
+        self._resolution_table = tuple( self._initialResolution / (1 << z) for z in range( MAX_ZOOM + 1 ) )
+
+        # zoom indexed tile extent in metres - power of two scaling keeps entries exact
+        self._tile_span_table = tuple( self._initialResolution * self._tileSize / (1 << z) for z in range( MAX_ZOOM + 1 ) )
         return
 
+    @property
+    def proj(self):
+        "Returns proj4 definition of Spherical Mercator EPSG:900913"
+        return _MERC_PROJ
+
     def LatLonToMeters(self, lat, lon ):
-        "Converts given lat/lon in WGS84 Datum to XY in Spherical Mercator EPSG:900913"
+        "Converts given lat/lon in WGS84 Datum to XY in Spherical Mercator EPSG:900913 - scalars or numpy arrays"
 
-        mx = lon * self._originShift / 180.0
-        my = math.log( math.tan((90 + lat) * math.pi / 360.0 )) / (math.pi / 180.0)
+        if isinstance( lat, np.ndarray ) or isinstance( lon, np.ndarray ):
 
-        my = my * self._originShift / 180.0
-        return mx, my
+            # single vectorized pass over arrays
+            mx = lon * _DEG2MERC
+            my = np.arcsinh( np.tan( lat * _DEG2RAD )) * _RAD2MERC
+            return mx, my
+
+        # compiled scalar kernel - cached as same points are converted at many zoom levels
+        return _latLonToMeters( lat, lon )
+
+    def LatLonToMetersVec(self, lat, lon, out=None ):
+        "Converts arrays of lat/lon to XY in Spherical Mercator EPSG:900913 as ( 2, n ) array - optionally written into out"
+
+        # scalar and 0-d input promoted to single point - rows of out always array views
+        lat = np.atleast_1d( np.asarray( lat, dtype=np.float64 ) )
+        lon = np.atleast_1d( np.asarray( lon, dtype=np.float64 ) )
+        if out is None:
+            out = np.empty( ( 2, ) + np.broadcast_shapes( lat.shape, lon.shape ) )
+
+        # in place ufuncs release gil - no temporaries so chunks convert concurrently across worker threads
+        np.multiply( lon, _DEG2MERC, out=out[0] )
+        np.multiply( lat, _DEG2RAD, out=out[1] )
+        np.tan( out[1], out=out[1] )
+        np.arcsinh( out[1], out=out[1] )
+        np.multiply( out[1], _RAD2MERC, out=out[1] )
+        return out
 
     def MetersToLatLon(self, mx, my ):
-        "Converts XY point from Spherical Mercator EPSG:900913 to lat/lon in WGS84 Datum"
+        "Converts XY point from Spherical Mercator EPSG:900913 to lat/lon in WGS84 Datum - scalars or numpy arrays"
+
+        if isinstance( mx, np.ndarray ) or isinstance( my, np.ndarray ):
 
-        lon = (mx / self._originShift) * 180.0
-        lat = (my / self._originShift) * 180.0
+            # single vectorized pass over arrays
+            lon = mx * _MERC2DEG
+            lat = _RAD2DEG * np.arctan( np.sinh( my * _MERC2RAD ))
+            return lat, lon
 
-        lat = 180 / math.pi * (2 * math.atan( math.exp( lat * math.pi / 180.0)) - math.pi / 2.0)
-        return lat, lon
+        # compiled scalar kernel
+        return kernels.meters_to_latlon( mx, my, _MERC2DEG, _MERC2RAD, _RAD2DEG )
 
     def PixelsToMeters(self, px, py, zoom):
         "Converts pixel coordinates in given zoom level of pyramid to EPSG:900913"
 
         res = self.Resolution( zoom )
-        mx = px * res - self._originShift
-        my = py * res - self._originShift
+        mx = px * res - _ORIGIN_SHIFT
+        my = py * res - _ORIGIN_SHIFT
         return mx, my
         
     def MetersToPixels(self, mx, my, zoom):
         "Converts EPSG:900913 to pyramid pixel coordinates in given zoom level"
                 
         res = self.Resolution( zoom )
-        px = (mx + self._originShift) / res
-        py = (my + self._originShift) / res
+        px = (mx + _ORIGIN_SHIFT) / res
+        py = (my + _ORIGIN_SHIFT) / res
         return px, py
     
     def PixelsToTile(self, px, py):
         "Returns a tile covering region in given pixel coordinates"
 
-        tx = int( math.ceil( px / float(self._tileSize) ) - 1 )
-        ty = int( math.ceil( py / float(self._tileSize) ) - 1 )
+        # true division yields float and math.ceil returns int - no casts required
+        tx = math.ceil( px / self._tileSize ) - 1
+        ty = math.ceil( py / self._tileSize ) - 1
         return tx, ty
 
     def PixelsToRaster(self, px, py, zoom):
@@ -160,65 +264,106 @@ class MercatorTiler(object):
     def MetersToTile(self, mx, my, zoom):
         "Returns tile for given mercator coordinates"
         
-        px, py = self.MetersToPixels( mx, my, zoom)
-        return self.PixelsToTile( px, py)
+        # single division per axis by tabulated tile extent - cheaper than compiled kernel dispatch
+        span = _tabulated( self._tile_span_table, zoom )
+        if span is None:
+            span = self._initialResolution * self._tileSize / (2**zoom)
+
+        tx = math.ceil( ( mx + _ORIGIN_SHIFT ) / span ) - 1
+        ty = math.ceil( ( my + _ORIGIN_SHIFT ) / span ) - 1
+        return tx, ty
 
     def TileBounds(self, tx, ty, zoom):
         "Returns bounds of the given tile in EPSG:900913 coordinates"
         
         minx, miny = self.PixelsToMeters( tx*self._tileSize, ty*self._tileSize, zoom )
         maxx, maxy = self.PixelsToMeters( (tx+1)*self._tileSize, (ty+1)*self._tileSize, zoom )
-        return ( miny, minx, maxy, maxx )
+        return MercBounds( miny, minx, maxy, maxx )
+
+    def TileBoundsVec(self, tx, ty, zoom):
+        "Returns bounds of arrays of tiles in EPSG:900913 coordinates as tuple of arrays"
+
+        tx = np.asarray( tx, dtype=np.float64 )
+        ty = np.asarray( ty, dtype=np.float64 )
+        return self.TileBounds( tx, ty, zoom )
 
     def TileLatLonBounds(self, tx, ty, zoom ):
         "Returns bounds of the given tile in latutude/longitude using WGS84 datum"
 
         bounds = self.TileBounds( tx, ty, zoom)
-        minLat, minLon = self.MetersToLatLon(bounds[0], bounds[1])
-        maxLat, maxLon = self.MetersToLatLon(bounds[2], bounds[3])
+        minLat, minLon = self.MetersToLatLon(bounds.minx, bounds.miny)
+        maxLat, maxLon = self.MetersToLatLon(bounds.maxx, bounds.maxy)
          
-        return ( minLat, minLon, maxLat, maxLon )
+        return Bounds( minLat, minLon, maxLat, maxLon )
         
+    def TileLatLonBoundsVec(self, tx, ty, zoom ):
+        "Returns bounds of arrays of tiles in latitude/longitude using WGS84 datum as tuple of arrays"
+
+        bounds = self.TileBoundsVec( tx, ty, zoom )
+        minLat, minLon = self.MetersToLatLon( bounds.minx, bounds.miny )
+        maxLat, maxLon = self.MetersToLatLon( bounds.maxx, bounds.maxy )
+
+        return Bounds( minLat, minLon, maxLat, maxLon )
+
     def Resolution(self, zoom ):
         "Resolution (meters/pixel) for given zoom level (measured at Equator)"
         
         # return (2 * math.pi * 6378137) / (self.tileSize * 2**zoom)
-        return self._initialResolution / (2**zoom)
+        res = _tabulated( self._resolution_table, zoom )
+        return res if res is not None else self._initialResolution / (2**zoom)
         
     def ZoomForPixelSize(self, pixelSize ):
         "Maximal scaledown zoom of the pyramid closest to the pixelSize."
         
-        for i in range(30):
-            if pixelSize > self.Resolution(i):
-                return i-1 if i!=0 else 0 # We don't want to scale up
+        # finer than deepest tabulated level
+        if pixelSize <= 0:
+            return MAX_ZOOM
+
+        # coarser than zoom 0 - we don't want to scale up
+        ratio = self._initialResolution / pixelSize
+        if ratio < 1:
+            return 0
+
+        # closed form deepest zoom with resolution no finer than pixelSize
+        z = min( int( math.log2( ratio ) ), MAX_ZOOM )
+
+        # correct log2 rounding where pixelSize falls on level boundary
+        if self._resolution_table[ z ] < pixelSize:
+            z -= 1
+        elif z < MAX_ZOOM and self._resolution_table[ z + 1 ] >= pixelSize:
+            z += 1
+
+        return z
 
     def GoogleTile(self, tx, ty, zoom):
         "Converts TMS tile coordinates to Google Tile coordinates"
         
         # coordinate origin is moved from bottom-left to top-left corner of the extent
-        return tx, (2**zoom - 1) - ty
+        return tx, ((1 << zoom) - 1) - ty
 
     def QuadTree(self, tx, ty, zoom ):
         "Converts TMS tile coordinates to Microsoft QuadTree"
         
-        quadKey = ""
-        ty = (2**zoom - 1) - ty
-        for i in range(zoom, 0, -1):
-            digit = 0
-            mask = 1 << (i-1)
-            if (tx & mask) != 0:
-                digit += 1
-            if (ty & mask) != 0:
-                digit += 2
-            quadKey += str(digit)
-            
-        return quadKey
+        # interleave tx / flipped ty bits into morton code - each base-4 digit is one bit pair
+        ty = ((1 << zoom) - 1) - ty
+        morton = _spreadBits( tx ) | ( _spreadBits( ty ) << 1 )
+
+        # each hex digit expands to two quadkey digits
+        quadKey = format( morton, '0{}x'.format( ( zoom + 1 ) // 2 ) ).translate( _HEX_TO_QUAD )
+        return quadKey[ len( quadKey ) - zoom : ]
 
     def LatLonToTile( self, lat, lon, z ):
         "Converts latlon to mercator tile coordinates"
 
-        mx, my = self.LatLonToMeters( lat, lon )
-        return self.MetersToTile( mx, my, z ) 
+        # zoom invariant projection served from cache - tile extent tabulated as in MetersToTile
+        mx, my = _latLonToMeters( lat, lon )
+        span = _tabulated( self._tile_span_table, z )
+        if span is None:
+            span = self._initialResolution * self._tileSize / (2**z)
+
+        tx = math.ceil( ( mx + _ORIGIN_SHIFT ) / span ) - 1
+        ty = math.ceil( ( my + _ORIGIN_SHIFT ) / span ) - 1
+        return tx, ty
         
 #-------------------------------------------------------
 # Translates between lat/long and the slippy-map tile
@@ -231,20 +376,30 @@ class MercatorTiler(object):
 #-------------------------------------------------------
 class SlippyTiler:
 
+    __slots__ = ( '_tileSize', '_num_tiles', '_inv_num_tiles' )
+
     def __init__( self, tileSize=256 ):
         self._tileSize=tileSize
-        self._proj='+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs'
+        self._num_tiles = tuple( float(1 << z) for z in range( MAX_ZOOM + 1 ) )
+        self._inv_num_tiles = tuple( 1.0 / n for n in self._num_tiles )
         return
 
+    @property
+    def proj( self ):
+        return _SLIPPY_PROJ
+
     def numTiles( self, z ):
-        return( math.pow(2,z) )
+        n = _tabulated( self._num_tiles, z )
+        return( n if n is not None else math.pow(2,z) )
 
     def sec( self, x ):
         return( 1.0 / math.cos(x) )
 
     def LatLonToRelativeXY( self, lat, lon ):
+        # tan + sec = ( sin + 1 ) / cos - radians converted once
+        r = math.radians(lat)
         x = ( lon + 180.0 ) / 360.0
-        y = (1.0 - math.log(math.tan(math.radians(lat)) + self.sec(math.radians(lat))) / math.pi) / 2.0
+        y = (1.0 - math.log((math.sin(r) + 1.0) / math.cos(r)) / math.pi) / 2.0
         return(x,y)
 
     def LatLonToXY( self, lat, lon, z ):
@@ -253,9 +408,23 @@ class SlippyTiler:
         return(n*x, n*y)
     
     def LatLonToTile( self, lat, lon, z):
-        x,y = self.LatLonToXY(lat,lon,z)
+        # tile count and relative xy inlined - no intermediate calls or tuples
+        n = self.numTiles(z)
+
+        r = math.radians(lat)
+        x = n * (( lon + 180.0 ) / 360.0)
+        y = n * ((1.0 - math.log((math.sin(r) + 1.0) / math.cos(r)) / math.pi) / 2.0)
         return(int(x),int(y))
 
+    def LatLonToTileVec( self, lat, lon, z ):
+        # arrays of points and / or zoom levels broadcast against each other
+        n = np.ldexp( 1.0, z ) if isinstance( z, np.ndarray ) else self.numTiles(z)
+        lat = np.radians( np.asarray( lat, dtype=np.float64 ) )
+        lon = np.asarray( lon, dtype=np.float64 )
+        x = ( lon + 180.0 ) / 360.0
+        y = (1.0 - np.log((np.sin(lat) + 1.0) / np.cos(lat)) / np.pi) / 2.0
+        return( (n*x).astype(np.int64), (n*y).astype(np.int64) )
+
     def XYToLatLon( self, x, y, z ):
         n = self.numTiles(z)
         relY = y / n
@@ -280,24 +449,56 @@ class SlippyTiler:
         return(lon1,lon2)
     
     def TileBounds( self, x, y, z ):
-        lat1,lat2 = self.LatBounds(y,z)
-        lon1,lon2 = self.LonBounds(x,z)
-        return( (lat2, lon1, lat1, lon2) ) # S,W,N,E
+        # lat / lon bounds inlined - tile fraction shared by both axes
+        unit = _tabulated( self._inv_num_tiles, z )
+        if unit is None:
+            unit = 1 / self.numTiles(z)
+
+        relY1 = y * unit
+        relY2 = relY1 + unit
+        lat1 = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * relY1))))
+        lat2 = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * relY2))))
+
+        lon1 = -180 + x * (360 * unit)
+        lon2 = lon1 + 360 * unit
+        return( Bounds(lat2, lon1, lat1, lon2) ) # S,W,N,E
+
+    def TileBoundsVec( self, x, y, z ):
+        n = np.ldexp( 1.0, z ) if isinstance( z, np.ndarray ) else self.numTiles(z)
+        x = np.asarray( x, dtype=np.float64 )
+        y = np.asarray( y, dtype=np.float64 )
+        lat1 = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / n))))
+        lat2 = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + 1) / n))))
+        lon1 = -180 + x * (360 / n)
+        lon2 = -180 + (x + 1) * (360 / n)
+        return( Bounds(lat2, lon1, lat1, lon2) ) # S,W,N,E
 
     def MercatorToLat(self, mercatorY):
         return(math.degrees(math.atan(math.sinh(mercatorY))))
 
 
+@functools.lru_cache( maxsize=None )
+def getTiler( name='mercator', tileSize=256 ):
+    "Returns shared stateless tiler instance of given flavour"
+
+    return SlippyTiler( tileSize ) if name == 'slippy' else MercatorTiler( tileSize )
+
+
+
 if __name__ == "__main__":
     obj = SlippyTiler()
-    for z in range(0,22):
-        #x,y = obj.LatLonToTile(51.50610, -0.119888, z)
-        x,y = obj.LatLonToTile( 15.5527, 48.5164, z)
-        x,y = obj.LatLonToTile( 12.75108333, 44.89085, z )
 
-        x,y = obj.LatLonToTile( 12.749273988762466, 44.88900829538637, z )
-        x,y = obj.LatLonToTile( 12.76757362, 44.8908577, z )
+    # convert all points at all zoom levels in single broadcast pass
+    zs = np.arange(0,22)[ :, None ]
+    pts = np.array( [   #[ 51.50610, -0.119888 ],
+                        [ 15.5527, 48.5164 ],
+                        [ 12.75108333, 44.89085 ],
+                        [ 12.749273988762466, 44.88900829538637 ],
+                        [ 12.76757362, 44.8908577 ] ] )
+
+    xs,ys = obj.LatLonToTileVec( pts[ :, 0 ], pts[ :, 1 ], zs )
+    s,w,n,e = obj.TileBoundsVec( xs, ys, zs )
 
-        s,w,n,e = obj.TileBounds(x,y,z)
-        print ( "%d: %d,%d --> %1.3f :: %1.3f, %1.3f :: %1.3f" % (z,x,y,s,n,w,e) )
+    for z in range(0,22):
+        print ( "%d: %d,%d --> %1.3f :: %1.3f, %1.3f :: %1.3f" % (z,xs[z,-1],ys[z,-1],s[z,-1],n[z,-1],w[z,-1],e[z,-1]) )
 
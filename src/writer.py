@@ -0,0 +1,317 @@
+import os
+import sys
+import asyncio
+import aiofiles
+
+from osgeo import gdal
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import liburing
+except ImportError:
+    liburing = None
+
+
+class FileWriter:
+
+    def __init__( self ):
+
+        """
+        constructor
+        """
+
+        return
+
+
+    async def submit( self, pathname, data ):
+
+        """
+        write data to pathname
+        """
+
+        async with aiofiles.open( pathname, 'wb' ) as f:
+            await f.write( data )
+
+        return pathname
+
+
+    def close( self ):
+
+        """
+        release resources
+        """
+
+        return
+
+
+class UringWriter( FileWriter ):
+
+    def __init__( self, batch_size=256 ):
+
+        """
+        constructor
+        """
+
+        # initialise base object
+        super().__init__()
+
+        # each file write is submitted as linked write + close entries
+        self._batch_size = batch_size
+        self._ring = liburing.Ring()
+        self._cqe = liburing.Cqe()
+        liburing.io_uring_queue_init( 2 * batch_size, self._ring )
+
+        # ring only ever accessed from single worker thread
+        self._executor = ThreadPoolExecutor( max_workers=1 )
+        self._pending = []
+        self._scheduled = False
+
+        return
+
+
+    async def submit( self, pathname, data ):
+
+        """
+        queue data for batched write to pathname
+        """
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append( ( pathname, data, future ) )
+
+        # flush immediately if batch full - else once ready callbacks have queued further writes
+        if len( self._pending ) >= self._batch_size:
+            self._flush()
+
+        elif not self._scheduled:
+            self._scheduled = True
+            loop.call_soon( self._flush )
+
+        await future
+        return pathname
+
+
+    def _flush( self ):
+
+        """
+        hand pending writes to worker thread
+        """
+
+        self._scheduled = False
+        if len( self._pending ) > 0:
+
+            batch = self._pending[ : self._batch_size ]
+            del self._pending[ : self._batch_size ]
+
+            # resolve futures once ring has drained
+            job = asyncio.get_running_loop().run_in_executor( self._executor, self._write, batch )
+            job.add_done_callback( lambda job: self._complete( batch, job ) )
+
+            # requeue remainder
+            if len( self._pending ) > 0:
+                self._flush()
+
+        return
+
+
+    def _complete( self, batch, job ):
+
+        """
+        propagate write results to awaiting coroutines
+        """
+
+        errors = job.exception() or job.result()
+        for idx, ( pathname, _, future ) in enumerate( batch ):
+
+            if future.done():
+                continue
+
+            error = errors if isinstance( errors, Exception ) else errors[ idx ]
+            if error is not None:
+                future.set_exception( error )
+            else:
+                future.set_result( None )
+
+        return
+
+
+    def _write( self, batch ):
+
+        """
+        submit batch of writes to ring with single syscall and drain completion queue
+        """
+
+        errors = [ None ] * len( batch )
+        fds = [ None ] * len( batch )
+
+        # queue linked write and close entries - no IOSQE_ASYNC flag so writes complete inline
+        count = 0
+        for idx, ( pathname, data, _ ) in enumerate( batch ):
+
+            try:
+                fd = fds[ idx ] = os.open( pathname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644 )
+            except OSError as e:
+                errors[ idx ] = e
+                continue
+
+            sqe = liburing.io_uring_get_sqe( self._ring )
+            liburing.io_uring_prep_write( sqe, fd, data, 0 )
+            liburing.io_uring_sqe_set_flags( sqe, liburing.IOSQE_IO_LINK )
+            liburing.io_uring_sqe_set_data64( sqe, idx )
+
+            sqe = liburing.io_uring_get_sqe( self._ring )
+            liburing.io_uring_prep_close( sqe, fd )
+            liburing.io_uring_sqe_set_data64( sqe, idx + len( batch ) )
+
+            count += 2
+
+        if count > 0:
+            liburing.io_uring_submit_and_wait( self._ring, count )
+
+        # reap completions one at a time - entry at masked head of ring valid across wrap-around
+        while count > 0:
+
+            liburing.io_uring_wait_cqe( self._ring, self._cqe )
+            cqe = self._cqe[ 0 ]
+            idx = liburing.io_uring_cqe_get_data64( cqe )
+            res = cqe.res
+
+            liburing.io_uring_cqe_seen( self._ring, cqe )
+            count -= 1
+
+            # record failed or short writes
+            if 0 <= idx < len( batch ):
+                if res != len( batch[ idx ][ 1 ] ):
+                    errors[ idx ] = OSError( -res if res < 0 else 0, 'write failed', batch[ idx ][ 0 ] )
+
+            # broken link cancels close - release descriptor directly
+            elif len( batch ) <= idx < len( batch ) + len( fds ):
+                if res < 0 and fds[ idx - len( batch ) ] is not None:
+                    os.close( fds[ idx - len( batch ) ] )
+
+        return errors
+
+
+    def close( self ):
+
+        """
+        release ring and worker thread
+        """
+
+        self._executor.shutdown()
+        liburing.io_uring_queue_exit( self._ring )
+        return
+
+
+class MemWriter( FileWriter ):
+
+    def __init__( self, limit=None ):
+
+        """
+        constructor
+        """
+
+        # initialise base object
+        super().__init__()
+
+        # disk writer created on first spill once limit in bytes exceeded
+        self._disk = None
+        self._limit = limit
+        self._size = 0
+
+        return
+
+
+    def reset( self, limit=None ):
+
+        """
+        start new in-memory budget - previous tiles assumed released
+        """
+
+        self._limit = limit
+        self._size = 0
+        return
+
+
+    async def submit( self, pathname, data ):
+
+        """
+        write data to gdal in-memory file - spill to disk once limit exceeded
+        """
+
+        # switch to file system when in-memory tiles exceed limit
+        if self._limit is not None and self._size + len( data ) > self._limit:
+
+            if self._disk is None:
+                self._disk = createDiskWriter()
+
+            return await self._disk.submit( pathname, data )
+
+        # copy into vsimem buffer - no file system access
+        mem_pathname = toMemPathname( pathname )
+        gdal.FileFromMemBuffer( mem_pathname, data )
+        self._size += len( data )
+
+        return mem_pathname
+
+
+    def close( self ):
+
+        """
+        release resources
+        """
+
+        if self._disk is not None:
+            self._disk.close()
+
+        return
+
+
+def toMemPathname( pathname ):
+
+    """
+    get gdal in-memory pathname mirroring file system pathname
+    """
+
+    return '/vsimem/' + os.path.abspath( pathname ).replace( '\\', '/' ).lstrip( '/' )
+
+
+def removeFile( pathname ):
+
+    """
+    remove file from file system or gdal in-memory file system
+    """
+
+    if pathname.startswith( '/vsimem/' ):
+        gdal.Unlink( pathname )
+
+    elif os.path.exists( pathname ):
+        os.remove( pathname )
+
+    return
+
+
+def createDiskWriter():
+
+    """
+    create io_uring writer where supported - fall back to aiofiles
+    """
+
+    if sys.platform.startswith( 'linux' ) and liburing is not None:
+
+        try:
+            return UringWriter()
+        except Exception as e:
+            print ( 'io_uring unavailable: {}'.format( str( e ) ) )
+
+    return FileWriter()
+
+
+def createWriter( limit=None ):
+
+    """
+    create in-memory writer spilling to disk when limit in bytes exceeded
+    """
+
+    return MemWriter( limit )
@@ -0,0 +1,46 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert( 0, os.path.join( os.path.dirname( __file__ ), '..', 'src' ) )
+
+pytest.importorskip( 'osgeo' )
+liburing = pytest.importorskip( 'liburing' )
+
+from writer import UringWriter
+
+
+def test_uring_writer_wraps_completion_queue( tmp_path ):
+
+    """
+    push many more completions than completion queue entries through single writer
+    """
+
+    fds = len( os.listdir( '/proc/self/fd' ) )
+    try:
+        writer = UringWriter( batch_size=8 )
+    except Exception as e:
+        pytest.skip( 'io_uring unavailable: {}'.format( str( e ) ) )
+
+    async def run():
+
+        # each write produces write + close completion - 400 completions through 32 entry ring
+        pathnames = [ str( tmp_path / 'tile_{}.png'.format( idx ) ) for idx in range( 200 ) ]
+        for offset in range( 0, len( pathnames ), 20 ):
+            await asyncio.gather( *[ writer.submit( pathname, pathname.encode() ) for pathname in pathnames[ offset : offset + 20 ] ] )
+
+        return pathnames
+
+    try:
+        pathnames = asyncio.run( run() )
+    finally:
+        writer.close()
+
+    for pathname in pathnames:
+        with open( pathname, 'rb' ) as f:
+            assert f.read() == pathname.encode()
+
+    # ring and tile descriptors released - none closed twice or left open
+    assert len( os.listdir( '/proc/self/fd' ) ) == fds